@@ -0,0 +1,71 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.urls import URLPattern
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.ASYNC_READ_THREADS,
+            thread_name_prefix='async-read'
+        )
+    return _executor
+
+
+def run_view(view, request, *args, **kwargs):
+    """Выполняет представление и отрисовывает ответ в потоке пула."""
+    close_old_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        if callable(getattr(response, 'render', None)):
+            response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+def async_read_view(view):
+    """
+    Асинхронная обертка синхронного представления для режима ASGI.
+
+    Чтение выполняется в ограниченном пуле потоков и не занимает
+    цикл событий, пока медленный клиент отправляет запрос или читает
+    ответ. Запросы на изменение выполняются как обычные синхронные
+    представления Django.
+    """
+    write_view = sync_to_async(view, thread_sensitive=True)
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in SAFE_METHODS:
+            return await write_view(request, *args, **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(
+            get_executor(), partial(run_view, view, request, *args, **kwargs)
+        )
+    return wrapper
+
+
+def async_read_patterns(patterns, names):
+    """Оборачивает представления маршрутов с именами names в режиме ASGI."""
+    if not settings.ASYNC_READ_VIEWS:
+        return patterns
+    return [
+        URLPattern(
+            pattern.pattern,
+            async_read_view(pattern.callback),
+            pattern.default_args,
+            pattern.name
+        ) if isinstance(pattern, URLPattern) and pattern.name in names
+        else pattern
+        for pattern in patterns
+    ]
@@ -0,0 +1,74 @@
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+
+from recipes.models import Recipe
+
+GENERATION_KEY = 'fragments:generation'
+
+
+def get_version(key):
+    """Возвращает общий для всех процессов токен версии."""
+    return cache.get_or_set(key, uuid.uuid4().hex, None)
+
+
+def bump_version(key):
+    """Меняет токен версии после фиксации текущей транзакции."""
+    transaction.on_commit(lambda: cache.set(key, uuid.uuid4().hex, None))
+
+
+def get_generation():
+    """Возвращает текущее поколение кэша фрагментов."""
+    return get_version(GENERATION_KEY)
+
+
+def bump_generation():
+    """Сбрасывает разом все фрагменты, начиная новое поколение."""
+    bump_version(GENERATION_KEY)
+
+
+def recipe_key(pk, version, generation):
+    return f'fragments:{generation}:recipe:{pk}:{version}'
+
+
+def author_key(pk, generation):
+    return f'fragments:{generation}:author:{pk}'
+
+
+def get_fragments(make_key, ids, render):
+    """
+    Возвращает словарь {id: фрагмент}.
+
+    Отсутствующие в кэше фрагменты строятся одним вызовом render
+    для всех недостающих id и сохраняются в кэш.
+    """
+    generation = get_generation()
+    keys = {pk: make_key(pk, generation) for pk in ids}
+    fragments = cache.get_many(keys.values())
+    missing = [pk for pk, key in keys.items() if key not in fragments]
+    if missing:
+        fresh = {keys[pk]: data for pk, data in render(missing).items()}
+        cache.set_many(fresh, settings.FRAGMENT_CACHE_TIMEOUT)
+        fragments.update(fresh)
+    return {pk: fragments[key] for pk, key in keys.items()}
+
+
+def invalidate_recipes(*pks):
+    """
+    Увеличивает версии рецептов в текущей транзакции.
+
+    Версия читается вместе со строкой рецепта и входит в ключ
+    фрагмента. Запрос, прочитавший строку до фиксации, сохранит
+    фрагмент под старой версией, который уже никто не прочитает.
+    """
+    Recipe.objects.filter(pk__in=pks).update(version=F('version') + 1)
+
+
+def invalidate_author(pk):
+    """Удаляет фрагмент автора после фиксации транзакции."""
+    transaction.on_commit(
+        lambda: cache.delete(author_key(pk, get_generation()))
+    )
@@ -0,0 +1,88 @@
+import base64
+import binascii
+import io
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from drf_extra_fields.fields import Base64ImageField
+from PIL import Image
+from rest_framework import serializers
+
+from api.images import rendition_url
+
+HEADER_BASE64_LENGTH = 64 * 1024
+
+
+def check_image_dimensions(file):
+    """
+    Проверяет размеры изображения по заголовку, не декодируя пиксели.
+
+    Защищает от изображений, которые распаковываются в огромный объем памяти.
+    """
+    try:
+        with Image.open(file) as image:
+            width, height = image.size
+    except Image.DecompressionBombError:
+        raise serializers.ValidationError('Изображение слишком большое.')
+    except Exception:
+        return
+    if (
+        max(width, height) > settings.IMAGE_MAX_SIDE
+        or width * height > settings.IMAGE_MAX_PIXELS
+    ):
+        raise serializers.ValidationError(
+            f'Изображение слишком большое: {width}x{height}.'
+        )
+
+
+class GuardedBase64ImageField(Base64ImageField):
+    """
+    Base64ImageField с проверкой объема и размеров до декодирования.
+
+    Кроме строки Base64 принимает файл из multipart/form-data.
+    """
+
+    def to_internal_value(self, base64_data):
+        if isinstance(base64_data, UploadedFile):
+            if base64_data.size > settings.IMAGE_MAX_BYTES:
+                raise serializers.ValidationError(
+                    'Файл изображения слишком большой.'
+                )
+            check_image_dimensions(base64_data)
+            base64_data.seek(0)
+            return serializers.ImageField.to_internal_value(
+                self, base64_data
+            )
+        if isinstance(base64_data, str):
+            data = base64_data.split(';base64,')[-1]
+            if len(data) * 3 // 4 > settings.IMAGE_MAX_BYTES:
+                raise serializers.ValidationError(
+                    'Файл изображения слишком большой.'
+                )
+            try:
+                header = base64.b64decode(data[:HEADER_BASE64_LENGTH])
+            except (TypeError, binascii.Error, ValueError):
+                header = None
+            if header:
+                check_image_dimensions(io.BytesIO(header))
+        return super().to_internal_value(base64_data)
+
+
+class RenditionField(serializers.ReadOnlyField):
+    """URL уменьшенной копии изображения из поля file_field объекта."""
+
+    def __init__(self, rendition, file_field, **kwargs):
+        self.rendition = rendition
+        self.file_field = file_field
+        kwargs['source'] = '*'
+        super().__init__(**kwargs)
+
+    def to_representation(self, instance):
+        url = rendition_url(
+            getattr(instance, self.file_field), self.rendition,
+            getattr(instance, f'{self.file_field}_rendered')
+        )
+        request = self.context.get('request')
+        if url is None or request is None:
+            return url
+        return request.build_absolute_uri(url)
@@ -1,6 +1,12 @@
 from django_filters import rest_framework as filters
 
+from api.indexes import get_recipe_ingredient_index
 from recipes.models import Recipe, Tag
+from recipes.search import search_recipes
+
+
+class NumberInFilter(filters.BaseInFilter, filters.NumberFilter):
+    """Список чисел через запятую."""
 
 
 class RecipesFilter(filters.FilterSet):
@@ -13,12 +19,34 @@ class RecipesFilter(filters.FilterSet):
     )
     is_favorited = filters.BooleanFilter(method='filter_user_relation')
     is_in_shopping_cart = filters.BooleanFilter(method='filter_user_relation')
+    search = filters.CharFilter(method='filter_search')
+    ingredients = NumberInFilter(method='filter_ingredients')
+    exclude_ingredients = NumberInFilter(method='filter_ingredients')
 
     class Meta:
         model = Recipe
-        fields = ('tags', 'author', 'is_in_shopping_cart', 'is_favorited')
+        fields = (
+            'tags', 'author', 'is_in_shopping_cart', 'is_favorited', 'search',
+            'ingredients', 'exclude_ingredients'
+        )
 
     def filter_user_relation(self, queryset, name, value):
         if not self.request.user.id:
             return queryset
         return queryset.filter(**{name: value})
+
+    def filter_search(self, queryset, name, value):
+        if not value.strip():
+            return queryset
+        return search_recipes(queryset, value).order_by(
+            '-search_rank', '-pub_date', '-id'
+        )
+
+    def filter_ingredients(self, queryset, name, value):
+        """Фильтрует по составу через инвертированный индекс ингредиентов."""
+        ids = [int(pk) for pk in value]
+        if not ids:
+            return queryset
+        if name == 'ingredients':
+            return get_recipe_ingredient_index().filter(queryset, include=ids)
+        return get_recipe_ingredient_index().filter(queryset, exclude=ids)
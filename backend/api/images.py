@@ -0,0 +1,103 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from multiprocessing import get_context
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import close_old_connections
+from PIL import Image, ImageOps
+
+_executor = None
+
+
+def rendition_name(name, rendition):
+    """Путь уменьшенной копии относительно хранилища медиафайлов."""
+    root, _ = os.path.splitext(name)
+    return (
+        f'renditions/{rendition}/{root}.'
+        f'{settings.IMAGE_RENDITION_FORMAT.lower()}'
+    )
+
+
+def rendition_url(file, rendition, rendered):
+    """
+    URL готовой уменьшенной копии или исходного файла, пока ее нет.
+
+    rendered - имя файла, для которого копии уже построены; хранилище
+    при этом не опрашивается.
+    """
+    if not file:
+        return None
+    if file.name != rendered:
+        return file.url
+    return default_storage.url(rendition_name(file.name, rendition))
+
+
+def make_renditions(source, targets, image_format):
+    """
+    Строит уменьшенные копии изображения.
+
+    Выполняется в отдельном процессе, поэтому работает только
+    с путями файлов и не обращается к Django.
+    """
+    with Image.open(source) as image:
+        largest = max(size for _, size in targets)
+        image.draft('RGB', largest)
+        image = ImageOps.exif_transpose(image).convert('RGB')
+        for path, size in targets:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temporary_path = f'{path}.tmp'
+            ImageOps.fit(image, size, Image.LANCZOS).save(
+                temporary_path, image_format, quality=80
+            )
+            os.replace(temporary_path, path)
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.IMAGE_WORKERS,
+            mp_context=get_context('spawn')
+        )
+    return _executor
+
+
+def schedule_renditions(file, kind, on_done=None):
+    """
+    Ставит построение уменьшенных копий файла в пул процессов.
+
+    on_done вызывается после успешного построения всех копий.
+    """
+    if not file:
+        return
+    targets = [
+        (default_storage.path(rendition_name(file.name, rendition)), size)
+        for rendition, size in settings.IMAGE_RENDITIONS[kind].items()
+    ]
+    targets = [target for target in targets if not os.path.exists(target[0])]
+    if not targets:
+        if on_done is not None:
+            on_done()
+        return
+    args = (file.path, targets, settings.IMAGE_RENDITION_FORMAT)
+    if not settings.IMAGE_WORKERS:
+        make_renditions(*args)
+        if on_done is not None:
+            on_done()
+        return
+    future = get_executor().submit(make_renditions, *args)
+    if on_done is not None:
+        future.add_done_callback(partial(finish_renditions, on_done))
+
+
+def finish_renditions(on_done, future):
+    """Вызывает on_done в потоке пула после успешного построения копий."""
+    if future.exception() is not None:
+        return
+    close_old_connections()
+    try:
+        on_done()
+    finally:
+        close_old_connections()
@@ -0,0 +1,403 @@
+import json
+import re
+import threading
+import time
+import zlib
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import BooleanField, Count, Expression, F
+
+from api.cache import get_version
+from recipes.models import Ingredient, RecipeIngredient
+from recipes.services import (get_recipe_ids, get_recipe_ingredients_state,
+                              recipe_ingredients_log_key)
+
+INGREDIENT_INDEX_KEY = 'indexes:ingredients'
+
+
+def normalize(value):
+    """Приводит строку к виду для поиска: без регистра, ё как е."""
+    return value.strip().casefold().replace('ё', 'е')
+
+
+class IngredientIndex:
+    """
+    Неизменяемый префиксный индекс названий ингредиентов.
+
+    Названия хранятся отсортированными, поиск по префиксу - два бинарных
+    поиска. Совпадения ранжируются по частоте ингредиента в рецептах.
+    """
+
+    def __init__(self, ingredients, version):
+        entries = sorted(
+            (normalize(item['name']), -item.pop('usage'), item['id'], item)
+            for item in ingredients
+        )
+        self.keys = tuple(entry[0] for entry in entries)
+        self.ranks = tuple(entry[1] for entry in entries)
+        self.items = tuple(entry[3] for entry in entries)
+        self.version = version
+        self.built_at = time.monotonic()
+
+    @classmethod
+    def build(cls, version):
+        return cls(
+            Ingredient.objects.annotate(usage=Count('recipe_ingredients'))
+            .values('id', 'name', 'measurement_unit', 'usage'),
+            version
+        )
+
+    def is_stale(self, version):
+        return (
+            self.version != version
+            or time.monotonic() - self.built_at
+            > settings.INGREDIENT_INDEX_TTL
+        )
+
+    def search(self, prefix, limit=None):
+        prefix = normalize(prefix)
+        if not prefix:
+            return list(self.items[:limit])
+        start = bisect_left(self.keys, prefix)
+        end = bisect_left(self.keys, prefix + '\uffff', start)
+        matches = sorted(
+            range(start, end), key=lambda position: self.ranks[position]
+        )
+        return [self.items[position] for position in matches[:limit]]
+
+
+_ingredient_index = None
+
+
+def get_ingredient_index():
+    """Возвращает индекс процесса, перестраивая его при изменениях."""
+    global _ingredient_index
+    version = get_version(INGREDIENT_INDEX_KEY)
+    index = _ingredient_index
+    if index is None or index.is_stale(version):
+        index = _ingredient_index = IngredientIndex.build(version)
+    return index
+
+
+BYTE_BITS = tuple(
+    tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256)
+)
+
+
+def popcount(bitmap):
+    return bin(bitmap).count('1')
+
+
+def bitmap_ids(bitmap, limit=None, reverse=False):
+    """
+    Возвращает номера установленных битов, пропуская нулевые байты.
+
+    reverse - от старших битов к младшим, limit - не больше limit номеров.
+    """
+    data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, 'little')
+    runs = re.finditer(rb'[^\x00]+', data)
+    if reverse:
+        runs = reversed(list(runs))
+    ids = []
+    for run in runs:
+        start, values = run.start(), run.group()
+        positions = range(len(values))
+        if reverse:
+            positions = reversed(positions)
+        for position in positions:
+            bits = BYTE_BITS[values[position]]
+            offset = (start + position) * 8
+            ids.extend(
+                offset + bit for bit in (reversed(bits) if reverse else bits)
+            )
+            if limit is not None and len(ids) >= limit:
+                return ids[:limit]
+    return ids
+
+
+def set_bit(bitmap, position, value):
+    """Устанавливает или сбрасывает бит в bytearray, расширяя его."""
+    if len(bitmap) <= position >> 3:
+        bitmap.extend(bytes((position >> 3) + 1 - len(bitmap)))
+    if value:
+        bitmap[position >> 3] |= 1 << (position & 7)
+    else:
+        bitmap[position >> 3] &= ~(1 << (position & 7)) & 0xFF
+
+
+def compress(bitmap):
+    return zlib.compress(bytes(bitmap), 1)
+
+
+def decompress(data):
+    return int.from_bytes(zlib.decompress(data), 'little') if data else 0
+
+
+def update_postings(postings, changes):
+    """Применяет изменения {ключ: [(id рецепта, есть ли он)]} к картам."""
+    for key, recipes in changes.items():
+        data = postings.get(key)
+        bitmap = bytearray(zlib.decompress(data) if data else b'')
+        for recipe_id, value in recipes:
+            set_bit(bitmap, recipe_id, value)
+        postings[key] = compress(bitmap)
+
+
+class IdIn(Expression):
+    """
+    Условие id IN (...) с одним параметром вместо параметра на каждый id.
+
+    PostgreSQL получает литерал массива (= ANY), SQLite - JSON (json_each),
+    поэтому число параметров и разбор запроса не растут с числом id.
+    """
+
+    def __init__(self, ids, field='pk'):
+        super().__init__(output_field=BooleanField())
+        self.ids = ids
+        self.target = F(field)
+
+    def resolve_expression(self, query=None, allow_joins=True, reuse=None,
+                           summarize=False, for_save=False):
+        clone = self.copy()
+        clone.target = self.target.resolve_expression(
+            query, allow_joins, reuse, summarize, for_save
+        )
+        return clone
+
+    def get_source_expressions(self):
+        return [self.target]
+
+    def set_source_expressions(self, expressions):
+        self.target, = expressions
+
+    def as_sql(self, compiler, connection):
+        sql, params = compiler.compile(self.target)
+        return (
+            f'{sql} = ANY(%s::bigint[])',
+            (*params, '{%s}' % ','.join(map(str, self.ids)))
+        )
+
+    def as_sqlite(self, compiler, connection):
+        sql, params = compiler.compile(self.target)
+        return (
+            f'{sql} IN (SELECT value FROM json_each(%s))',
+            (*params, json.dumps(self.ids))
+        )
+
+
+class PantryMatches:
+    """
+    Ленивая последовательность рецептов, отсортированных по покрытию.
+
+    Состоит из групп (найдено, всего ингредиентов, битовая карта);
+    id извлекаются только для запрошенного среза.
+    """
+
+    def __init__(self, tiers):
+        self.tiers = [
+            (matched, size, bitmap, popcount(bitmap))
+            for matched, size, bitmap in tiers
+        ]
+
+    def __len__(self):
+        return sum(tier[3] for tier in self.tiers)
+
+    def __getitem__(self, index):
+        start, stop, _ = index.indices(len(self))
+        items = []
+        for matched, size, bitmap, total in self.tiers:
+            if start >= total:
+                start -= total
+                stop -= total
+                continue
+            items.extend(
+                {'id': pk, 'matched': matched, 'size': size}
+                for pk in bitmap_ids(bitmap, stop, reverse=True)[start:stop]
+            )
+            if stop <= total:
+                break
+            start, stop = 0, stop - total
+        return items
+
+
+class RecipeIngredientIndex:
+    """
+    Инвертированный индекс: ингредиент -> битовая карта id рецептов.
+
+    Карты хранятся сжатыми zlib, для запроса распаковываются в int,
+    и пересечения считаются побитовыми операциями над целыми числами.
+    Так же хранятся карты рецептов по числу ингредиентов.
+    Изменения состава рецептов применяются из журнала в общем кэше;
+    version и sequence - версия журнала и номер последней примененной
+    записи.
+    """
+
+    def __init__(self, bitmaps, sizes, version, sequence):
+        self.postings = {
+            ingredient_id: compress(bitmap)
+            for ingredient_id, bitmap in bitmaps.items()
+        }
+        self.sizes = sizes
+        size_bitmaps = defaultdict(bytearray)
+        for recipe_id, size in enumerate(sizes):
+            if size:
+                set_bit(size_bitmaps[size], recipe_id, True)
+        self.size_postings = {
+            size: compress(bitmap) for size, bitmap in size_bitmaps.items()
+        }
+        self.version = version
+        self.sequence = sequence
+
+    @classmethod
+    def build(cls, version, sequence):
+        bitmaps = defaultdict(bytearray)
+        sizes = bytearray()
+        for ingredient_id, recipe_id in (
+            RecipeIngredient.objects.order_by()
+            .values_list('ingredient_id', 'recipe_id').iterator()
+        ):
+            set_bit(bitmaps[ingredient_id], recipe_id, True)
+            if len(sizes) <= recipe_id:
+                sizes.extend(bytes(recipe_id + 1 - len(sizes)))
+            sizes[recipe_id] = min(sizes[recipe_id] + 1, 255)
+        return cls(bitmaps, sizes, version, sequence)
+
+    def bitmap(self, ingredient_id):
+        return decompress(self.postings.get(ingredient_id))
+
+    def apply(self, pairs):
+        """Приводит биты затронутых пар и размеры рецептов к БД."""
+        recipe_ids = {recipe_id for recipe_id, _ in pairs}
+        ingredient_ids = {ingredient_id for _, ingredient_id in pairs}
+        present = set(RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids, ingredient_id__in=ingredient_ids
+        ).values_list('recipe_id', 'ingredient_id'))
+        changes = defaultdict(list)
+        for recipe_id, ingredient_id in pairs:
+            changes[ingredient_id].append(
+                (recipe_id, (recipe_id, ingredient_id) in present)
+            )
+        update_postings(self.postings, changes)
+        counts = dict(
+            RecipeIngredient.objects.filter(recipe_id__in=recipe_ids)
+            .order_by().values('recipe_id').annotate(total=Count('pk'))
+            .values_list('recipe_id', 'total')
+        )
+        changes = defaultdict(list)
+        for recipe_id in recipe_ids:
+            if len(self.sizes) <= recipe_id:
+                self.sizes.extend(bytes(recipe_id + 1 - len(self.sizes)))
+            old = self.sizes[recipe_id]
+            new = min(counts.get(recipe_id, 0), 255)
+            if old == new:
+                continue
+            if old:
+                changes[old].append((recipe_id, False))
+            if new:
+                changes[new].append((recipe_id, True))
+            self.sizes[recipe_id] = new
+        update_postings(self.size_postings, changes)
+
+    def filter(self, queryset, include=(), exclude=()):
+        """
+        Оставляет в выборке рецепты со всеми include и без exclude.
+
+        В SQL одним параметром передается меньшая из двух частей:
+        подходящие id или id остальных рецептов для исключения.
+        """
+        universe = int.from_bytes(get_recipe_ids().bits, 'little')
+        result = universe
+        for ingredient_id in include:
+            result &= self.bitmap(ingredient_id)
+        for ingredient_id in exclude:
+            result &= ~self.bitmap(ingredient_id)
+        rest = universe & ~result
+        if popcount(result) <= popcount(rest):
+            return queryset.filter(IdIn(bitmap_ids(result)))
+        return queryset.exclude(IdIn(bitmap_ids(rest)))
+
+    def match_pantry(self, pantry, max_missing=None):
+        """
+        Ранжирует рецепты по доле ингредиентов, которые есть в pantry.
+
+        Число найденных ингредиентов каждого рецепта считается сразу
+        для всех рецептов: карты ингредиентов складываются побитовым
+        сумматором в разряды счетчика (bit-sliced counter).
+        """
+        candidates, planes = 0, []
+        for ingredient_id in pantry:
+            carry = self.bitmap(ingredient_id)
+            candidates |= carry
+            for position, plane in enumerate(planes):
+                planes[position], carry = plane ^ carry, plane & carry
+                if not carry:
+                    break
+            if carry:
+                planes.append(carry)
+        exact = {}
+        tiers = []
+        for size, data in self.size_postings.items():
+            size_bitmap = None
+            lowest = 1 if max_missing is None else max(1, size - max_missing)
+            for matched in range(lowest, min(size, len(pantry)) + 1):
+                if matched not in exact:
+                    bitmap = 0 if matched >> len(planes) else candidates
+                    for position, plane in enumerate(planes):
+                        bitmap &= (
+                            plane if matched >> position & 1 else ~plane
+                        )
+                    exact[matched] = bitmap
+                if not exact[matched]:
+                    continue
+                if size_bitmap is None:
+                    size_bitmap = decompress(data)
+                tier = exact[matched] & size_bitmap
+                if tier:
+                    tiers.append((matched, size, tier))
+        tiers.sort(key=lambda tier: (
+            -tier[0] / tier[1], tier[1] - tier[0], -tier[0]
+        ))
+        return PantryMatches(tiers)
+
+
+_recipe_ingredient_index = None
+_recipe_ingredient_lock = threading.Lock()
+
+
+def get_recipe_ingredient_index():
+    """
+    Возвращает индекс состава рецептов процесса.
+
+    Новые записи журнала применяются к индексу, а при смене версии
+    журнала, его разрыве или слишком большом отставании индекс
+    строится заново.
+    """
+    global _recipe_ingredient_index
+    with _recipe_ingredient_lock:
+        version, sequence = get_recipe_ingredients_state()
+        index = _recipe_ingredient_index
+        if index is not None and index.version != version:
+            index = None
+        if index is not None and index.sequence < sequence and (
+            sequence - index.sequence
+            <= settings.RECIPE_INGREDIENTS_LOG_LIMIT
+        ):
+            keys = [
+                recipe_ingredients_log_key(number)
+                for number in range(index.sequence + 1, sequence + 1)
+            ]
+            entries = cache.get_many(keys)
+            if len(entries) == len(keys):
+                index.apply({
+                    tuple(pair)
+                    for pairs in entries.values() for pair in pairs
+                })
+                index.sequence = sequence
+        if index is None or index.sequence != sequence:
+            index = _recipe_ingredient_index = (
+                RecipeIngredientIndex.build(version, sequence)
+            )
+        return index
@@ -1,6 +1,114 @@
-from rest_framework.pagination import PageNumberPagination
+import heapq
+from collections import OrderedDict
+
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (Cursor, CursorPagination,
+                                       PageNumberPagination)
+from rest_framework.response import Response
 
 
 class PageNumberLimitPagination(PageNumberPagination):
     """Пагинатор для рецептов."""
     page_size_query_param = 'limit'
+
+
+class RecipeCursorPagination(CursorPagination):
+    """Курсорный пагинатор для ленты рецептов."""
+    ordering = ('-pub_date', '-id')
+    page_size_query_param = 'limit'
+
+
+class SubscriptionCursorPagination(CursorPagination):
+    """Курсорный пагинатор для подписок."""
+    ordering = ('username',)
+    page_size_query_param = 'limit'
+
+
+class PageNumberOrCursorPagination(PageNumberLimitPagination):
+    """
+    Постраничный пагинатор с курсорным режимом по запросу.
+
+    Курсорный режим включается параметром ?pagination=cursor
+    и не выполняет COUNT(*) и OFFSET по всей выборке.
+    """
+    mode_query_param = 'pagination'
+    cursor_mode = 'cursor'
+    cursor_pagination_class = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        if request.query_params.get(self.mode_query_param) != self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+        self.cursor_paginator = self.cursor_pagination_class()
+        return self.cursor_paginator.paginate_queryset(
+            queryset, request, view
+        )
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is None:
+            return super().get_paginated_response(data)
+        return self.cursor_paginator.get_paginated_response(data)
+
+
+class RecipePagination(PageNumberOrCursorPagination):
+    """Пагинатор для рецептов с курсорным режимом."""
+    cursor_pagination_class = RecipeCursorPagination
+
+
+class SubscriptionPagination(PageNumberOrCursorPagination):
+    """Пагинатор для подписок с курсорным режимом."""
+    cursor_pagination_class = SubscriptionCursorPagination
+
+
+class FeedCursorPagination(CursorPagination):
+    """
+    Курсорный пагинатор ленты подписок.
+
+    Страница собирается слиянием упорядоченных источников, позиция
+    курсора - дата публикации и id последнего рецепта страницы.
+    """
+    page_size_query_param = 'limit'
+
+    def decode_position(self, request):
+        cursor = self.decode_cursor(request)
+        if cursor is None:
+            return None
+        try:
+            pub_date, pk = cursor.position.rsplit('|', 1)
+            position = parse_datetime(pub_date), int(pk)
+        except (AttributeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if position[0] is None:
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def paginate_sources(self, sources, request):
+        """Возвращает id рецептов страницы из источников feed_sources."""
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        position = self.decode_position(request)
+        rows = []
+        for row in heapq.merge(*(
+            source(position, self.page_size + 1) for source in sources
+        ), reverse=True):
+            if not rows or rows[-1] != row:
+                rows.append(row)
+        self.next_position = (
+            rows[self.page_size - 1] if len(rows) > self.page_size else None
+        )
+        return [pk for _, pk in rows[:self.page_size]]
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        pub_date, pk = self.next_position
+        return self.encode_cursor(Cursor(
+            offset=0, reverse=False, position=f'{pub_date.isoformat()}|{pk}'
+        ))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict((
+            ('next', self.get_next_link()),
+            ('results', data),
+        )))
@@ -1,11 +1,21 @@
 from django.contrib.auth import get_user_model
+from django.db import models, transaction
+from django.db.models import Prefetch, Value, prefetch_related_objects
 from djoser.serializers import UserSerializer as DjoserUserSerializer
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
+from rest_framework.utils import html
 
+from api.cache import author_key, get_fragments, invalidate_recipes, recipe_key
+from api.fields import GuardedBase64ImageField, RenditionField
+from api.services import get_recipes_limit, parse_form_data
 from recipes.constants import Constants
+from recipes.minhash import ingredients_signature
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
                             ShoppingCart, Tag)
+from recipes.services import (log_recipe_ingredients,
+                              update_shopping_cart_totals)
+from recipes.similarity import find_similar_by_ingredients, index_signatures
 from users.models import Follow
 
 User = get_user_model()
@@ -15,14 +25,18 @@ class UserDetailSerializer(DjoserUserSerializer):
     """Сериализатор для просмотра пользователей."""
 
     is_subscribed = serializers.SerializerMethodField(read_only=True)
+    avatar_thumbnail = RenditionField('avatar', 'avatar')
 
     class Meta(DjoserUserSerializer.Meta):
         fields = DjoserUserSerializer.Meta.fields + (
             'is_subscribed',
-            'avatar'
+            'avatar',
+            'avatar_thumbnail'
         )
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context['request']
         return (
             request.user.is_authenticated
@@ -33,12 +47,17 @@ class UserDetailSerializer(DjoserUserSerializer):
 class AvatarSerializer(serializers.ModelSerializer):
     """Сериализатор для аватара."""
 
-    avatar = Base64ImageField(required=True)
+    avatar = GuardedBase64ImageField(required=True)
 
     class Meta:
         model = User
         fields = ('avatar',)
 
+    def update(self, instance, validated_data):
+        instance.avatar = validated_data['avatar']
+        instance.save(update_fields=('avatar',))
+        return instance
+
 
 class TagsSerializer(serializers.ModelSerializer):
     """Сериализатор для тегов."""
@@ -71,8 +90,13 @@ class RecipeIngredientReadSerializer(serializers.ModelSerializer):
 
 
 class RecipeIngredientWriteSerializer(serializers.ModelSerializer):
-    """Сериализатор для создания ингредиентов рецепта."""
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all(),)
+    """
+    Сериализатор для создания ингредиентов рецепта.
+
+    Существование ингредиентов проверяется одним запросом
+    в RecipeWriteSerializer.validate_ingredients.
+    """
+    id = serializers.IntegerField()
     amount = serializers.IntegerField(
         min_value=Constants.MIN_AMOUNT,
         error_messages={
@@ -90,14 +114,28 @@ class RecipeShortSerializer(serializers.ModelSerializer):
     """Сериализатор для коротких рецептов."""
 
     image = Base64ImageField(read_only=True)
+    thumbnail = RenditionField('card', 'image')
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'thumbnail', 'cooking_time')
+
+
+class RecipeReadListSerializer(serializers.ListSerializer):
+    """Сериализатор списка рецептов с общим обращением к кэшу."""
+
+    def to_representation(self, data):
+        recipes = data.all() if isinstance(data, models.Manager) else data
+        return self.child.to_representation_many(list(recipes))
 
 
 class RecipeReadSerializer(serializers.ModelSerializer):
-    """Сериализатор для чтения рецептов."""
+    """
+    Сериализатор для чтения рецептов.
+
+    Независимая от пользователя часть рецепта и автора берется из кэша,
+    поля текущего пользователя добавляются при каждом ответе.
+    """
 
     tags = TagsSerializer(many=True, read_only=True)
     author = UserDetailSerializer(read_only=True)
@@ -105,28 +143,129 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         source='recipe_ingredients', many=True, read_only=True
     )
     image = Base64ImageField(read_only=True)
+    thumbnail = RenditionField('card', 'image')
     is_favorited = serializers.BooleanField(read_only=True, default=False)
     is_in_shopping_cart = serializers.BooleanField(
         read_only=True, default=False
     )
 
+    USER_FIELDS = ('author', 'is_favorited', 'is_in_shopping_cart')
+
     class Meta:
         model = Recipe
         fields = (
             'id', 'tags', 'author', 'ingredients',
             'is_favorited', 'is_in_shopping_cart',
-            'name', 'image', 'text', 'cooking_time'
+            'name', 'image', 'thumbnail', 'text', 'cooking_time'
         )
+        list_serializer_class = RecipeReadListSerializer
+
+    @staticmethod
+    def get_prefetches():
+        """Связанные данные, которые читает сериализатор."""
+        return (
+            'tags',
+            Prefetch(
+                'recipe_ingredients',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            ),
+        )
+
+    def get_fragment(self, instance):
+        """Представление рецепта без полей текущего пользователя."""
+        return {
+            field.field_name: field.to_representation(
+                field.get_attribute(instance)
+            )
+            for field in self._readable_fields
+            if field.field_name not in self.USER_FIELDS
+        }
+
+    @classmethod
+    def render_recipes(cls, recipes):
+        prefetch_related_objects(recipes, *cls.get_prefetches())
+        serializer = cls(context={})
+        return {
+            recipe.id: serializer.get_fragment(recipe) for recipe in recipes
+        }
+
+    @staticmethod
+    def render_authors(ids):
+        serializer = UserDetailSerializer(context={})
+        return {
+            author.id: serializer.to_representation(author)
+            for author in User.objects.filter(pk__in=ids).annotate(
+                is_subscribed=Value(False)
+            )
+        }
+
+    def build_url(self, url):
+        request = self.context.get('request')
+        if request is None or not url:
+            return url
+        return request.build_absolute_uri(url)
+
+    def to_representation(self, instance):
+        return self.to_representation_many([instance])[0]
+
+    def to_representation_many(self, recipes):
+        recipes_by_id = {recipe.id: recipe for recipe in recipes}
+        fragments = get_fragments(
+            lambda pk, generation: recipe_key(
+                pk, recipes_by_id[pk].version, generation
+            ),
+            recipes_by_id,
+            lambda ids: self.render_recipes(
+                [recipes_by_id[pk] for pk in ids]
+            )
+        )
+        authors = get_fragments(
+            author_key, {recipe.author_id for recipe in recipes},
+            self.render_authors
+        )
+        request = self.context.get('request')
+        subscribed = set()
+        if request is not None and request.user.is_authenticated:
+            subscribed = set(Follow.objects.filter(
+                user=request.user, author__in=authors
+            ).values_list('author_id', flat=True))
+        data = []
+        for recipe in recipes:
+            author = dict(
+                authors[recipe.author_id],
+                is_subscribed=recipe.author_id in subscribed
+            )
+            for field in ('avatar', 'avatar_thumbnail'):
+                author[field] = self.build_url(author[field])
+            representation = dict(
+                fragments[recipe.id],
+                author=author,
+                image=self.build_url(fragments[recipe.id]['image']),
+                thumbnail=self.build_url(fragments[recipe.id]['thumbnail']),
+                is_favorited=getattr(recipe, 'is_favorited', False),
+                is_in_shopping_cart=getattr(
+                    recipe, 'is_in_shopping_cart', False
+                ),
+            )
+            data.append({
+                name: representation[name] for name in self.Meta.fields
+            })
+        return data
 
 
 class RecipeWriteSerializer(serializers.ModelSerializer):
-    """Сериализатор для создания и редактирования рецептов."""
+    """
+    Сериализатор для создания и редактирования рецептов.
+
+    Принимает JSON с изображением в Base64 или multipart/form-data
+    с файлом изображения и ingredients, tags в виде JSON.
+    """
+
+    FORM_JSON_FIELDS = ('ingredients', 'tags')
 
     ingredients = RecipeIngredientWriteSerializer(many=True, write_only=True)
-    tags = serializers.PrimaryKeyRelatedField(
-        many=True, queryset=Tag.objects.all()
-    )
-    image = Base64ImageField(required=True)
+    tags = serializers.ListField(child=serializers.IntegerField())
+    image = GuardedBase64ImageField(required=True)
 
     class Meta:
         model = Recipe
@@ -137,24 +276,98 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
 
     @staticmethod
     def create_ingredients(recipe, ingredients):
-        return RecipeIngredient.objects.bulk_create([
+        recipe_ingredients = RecipeIngredient.objects.bulk_create([
             RecipeIngredient(
                 recipe=recipe,
                 ingredient=ingredient['id'],
                 amount=ingredient['amount']
             )for ingredient in ingredients
         ])
+        log_recipe_ingredients(
+            (recipe.id, ingredient['id'].id) for ingredient in ingredients
+        )
+        return recipe_ingredients
+
+    @staticmethod
+    def update_ingredients(recipe, ingredients):
+        """
+        Приводит ингредиенты рецепта к новому составу.
+
+        Создаются, обновляются и удаляются только изменившиеся строки.
+        """
+        rows = {
+            row.ingredient_id: row
+            for row in recipe.recipe_ingredients.all()
+        }
+        old_amounts = {pk: row.amount for pk, row in rows.items()}
+        new_amounts = {
+            item['id'].id: item['amount'] for item in ingredients
+        }
+        if old_amounts == new_amounts:
+            return
+        added = [
+            ingredient_id for ingredient_id in new_amounts
+            if ingredient_id not in rows
+        ]
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(
+                recipe=recipe,
+                ingredient_id=ingredient_id,
+                amount=new_amounts[ingredient_id]
+            )
+            for ingredient_id in added
+        ])
+        log_recipe_ingredients(
+            (recipe.id, ingredient_id) for ingredient_id in added
+        )
+        changed = []
+        for ingredient_id, row in rows.items():
+            amount = new_amounts.get(ingredient_id)
+            if amount is not None and amount != row.amount:
+                row.amount = amount
+                changed.append(row)
+        RecipeIngredient.objects.bulk_update(changed, ('amount',))
+        removed = [
+            row.pk for ingredient_id, row in rows.items()
+            if ingredient_id not in new_amounts
+        ]
+        if removed:
+            RecipeIngredient.objects.filter(pk__in=removed).delete()
+        invalidate_recipes(recipe.id)
+        update_shopping_cart_totals(recipe.id, old_amounts, new_amounts)
+        if old_amounts.keys() != new_amounts.keys():
+            recipe.ingredients_signature = ingredients_signature(new_amounts)
+            index_signatures({recipe.id: recipe.ingredients_signature})
+
+    def to_internal_value(self, data):
+        if html.is_html_input(data):
+            data = parse_form_data(data, self.FORM_JSON_FIELDS)
+        return super().to_internal_value(data)
+
+    @staticmethod
+    def get_objects(model, ids, name):
+        """Загружает объекты одним запросом, сообщая о всех отсутствующих."""
+        found = model.objects.in_bulk(ids)
+        missing = [pk for pk in ids if pk not in found]
+        if missing:
+            raise serializers.ValidationError(
+                f'{name} не существуют: {", ".join(map(str, missing))}.'
+            )
+        return found
 
     def validate_ingredients(self, ingredients):
         if not ingredients:
             raise serializers.ValidationError(
                 'Поле не может быть пустым!'
             )
-        ingredient_ids = [item['id'].id for item in ingredients]
+        ingredient_ids = [item['id'] for item in ingredients]
         if len(ingredient_ids) != len(set(ingredient_ids)):
             raise serializers.ValidationError(
                 'Ингредиенты не должны повторяться!'
             )
+        found = self.get_objects(Ingredient, ingredient_ids, 'Ингредиенты')
+        for item in ingredients:
+            item['id'] = found[item['id']]
         return ingredients
 
     def validate_tags(self, tags):
@@ -162,12 +375,12 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 'Нужно выбрать хотя бы один тег!'
             )
-        tag_ids = [tag.id for tag in tags]
-        if len(tag_ids) != len(set(tag_ids)):
+        if len(tags) != len(set(tags)):
             raise serializers.ValidationError(
                 'Теги не должны повторяться!'
             )
-        return tags
+        found = self.get_objects(Tag, tags, 'Теги')
+        return [found[pk] for pk in tags]
 
     def validate_image(self, value):
         if value in ('', None):
@@ -176,16 +389,28 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             )
         return value
 
+    @transaction.atomic
     def create(self, data, **kwargs):
         tags = data.pop('tags')
         ingredients = data.pop('ingredients')
+        signature = ingredients_signature(
+            ingredient['id'].id for ingredient in ingredients
+        )
+        near_duplicates = find_similar_by_ingredients(
+            signature, min_similarity=Constants.NEAR_DUPLICATE_SIMILARITY
+        )
         recipe = Recipe.objects.create(
-            author=self.context.get('request').user, **data
+            author=self.context.get('request').user,
+            ingredients_signature=signature,
+            **data
         )
         recipe.tags.set(tags)
         self.create_ingredients(recipe, ingredients)
+        index_signatures({recipe.id: signature}, replace=False)
+        recipe.near_duplicates = near_duplicates
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         if 'ingredients' not in validated_data or 'tags' not in validated_data:
             raise serializers.ValidationError({
@@ -196,20 +421,51 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             instance.tags.set(tags)
         ingredients_data = validated_data.pop('ingredients', None)
         if ingredients_data is not None:
-            instance.recipe_ingredients.all().delete()
-            self.create_ingredients(instance, ingredients_data)
-        return super().update(instance, validated_data)
+            self.update_ingredients(instance, ingredients_data)
+        instance = super().update(instance, validated_data)
+        instance.refresh_from_db(fields=('version',))
+        return instance
 
     def to_representation(self, instance):
-        return RecipeReadSerializer(instance, context=self.context).data
+        data = RecipeReadSerializer(instance, context=self.context).data
+        near_duplicates = getattr(instance, 'near_duplicates', None)
+        if near_duplicates is not None:
+            data['near_duplicates'] = [
+                {'id': recipe_id, 'similarity': round(similarity, 3)}
+                for similarity, recipe_id in near_duplicates
+            ]
+        return data
+
+
+class PantryMatchQuerySerializer(serializers.Serializer):
+    """Параметры подбора рецептов по имеющимся ингредиентам."""
+
+    ingredients = serializers.CharField()
+    max_missing = serializers.IntegerField(min_value=0, required=False)
+
+    def validate_ingredients(self, value):
+        try:
+            ids = {int(pk) for pk in value.split(',') if pk.strip()}
+        except ValueError:
+            raise serializers.ValidationError(
+                'Укажите id ингредиентов через запятую.'
+            )
+        if not ids:
+            raise serializers.ValidationError(
+                'Нужно указать хотя бы один ингредиент!'
+            )
+        if len(ids) > Constants.MAX_PANTRY_SIZE:
+            raise serializers.ValidationError(
+                f'Можно указать не больше {Constants.MAX_PANTRY_SIZE} '
+                f'ингредиентов.'
+            )
+        return ids
 
 
 class SubscriptionSerializer(UserDetailSerializer):
     """Сериализатор для вывода информации о подписках."""
 
-    recipes_count = serializers.IntegerField(
-        read_only=True, default=Constants.RECIPES_COUNT
-    )
+    recipes_count = serializers.IntegerField(read_only=True)
     recipes = serializers.SerializerMethodField(read_only=True)
 
     class Meta(UserDetailSerializer.Meta):
@@ -219,14 +475,13 @@ class SubscriptionSerializer(UserDetailSerializer):
         )
 
     def get_recipes(self, obj):
-        try:
-            limit = int(
-                self.context.get('request').query_params.get('recipes_limit')
-            )
-        except (TypeError, ValueError):
-            limit = None
+        recipes = getattr(obj, 'limited_recipes', None)
+        if recipes is None:
+            recipes = obj.recipes.all()[
+                :get_recipes_limit(self.context['request'])
+            ]
         return RecipeShortSerializer(
-            obj.recipes.all()[:limit], many=True, context=self.context).data
+            recipes, many=True, context=self.context).data
 
 
 class SubscriptionCreateSerializer(serializers.ModelSerializer):
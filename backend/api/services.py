@@ -1,10 +1,176 @@
-def generate_shoping_list(ingredients_queryset):
-    """Генерирует текст для списка покупок."""
-    lines = ['Список покупок:\n']
-    for item in ingredients_queryset:
-        lines.append(
+import csv
+import json
+from hashlib import md5
+
+from django.db.models import Exists, F, OuterRef, Prefetch, Subquery, Window
+from django.db.models.functions import RowNumber
+from django.utils.http import quote_etag
+from rest_framework import serializers
+
+from api.cache import get_version
+from api.indexes import INGREDIENT_INDEX_KEY
+from recipes.constants import Constants
+from recipes.models import Favorite, Recipe, ShoppingCart
+from recipes.services import get_shopping_cart_version
+from users.models import Follow
+
+
+def parse_form_data(data, json_fields):
+    """
+    Приводит данные multipart/form-data к виду JSON-запроса.
+
+    Поля из json_fields передаются строкой JSON или, для списков,
+    повторяющимися полями формы; остальные поля берутся как есть.
+    """
+    parsed = {}
+    for field, values in data.lists():
+        if field not in json_fields:
+            parsed[field] = values[-1]
+            continue
+        if len(values) == 1 and isinstance(values[0], str):
+            try:
+                decoded = json.loads(values[0])
+            except ValueError:
+                decoded = None
+            if isinstance(decoded, (list, dict)):
+                values = decoded
+        parsed[field] = values
+    return parsed
+
+
+def annotate_is_subscribed(queryset, user):
+    """Аннотирует выборку авторов признаком подписки пользователя."""
+    if not user.is_authenticated:
+        return queryset
+    return queryset.annotate(is_subscribed=Exists(
+        Follow.objects.filter(user=user, author=OuterRef('pk'))
+    ))
+
+
+def annotate_recipe_flags(queryset, user):
+    """Аннотирует рецепты признаками избранного и списка покупок."""
+    if not user.is_authenticated:
+        return queryset
+    return queryset.annotate(
+        is_favorited=Exists(Favorite.objects.filter(
+            recipe=OuterRef('pk'), user=user
+        )),
+        is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+            recipe=OuterRef('pk'), user=user
+        )),
+    )
+
+
+def get_user_recipe_ids(user):
+    """Последние рецепты пользователя в избранном и в списке покупок."""
+    limit = Constants.MAX_RECOMMENDATION_SOURCES
+    return {
+        recipe_id for model in (Favorite, ShoppingCart)
+        for recipe_id in model.objects.filter(user=user).order_by(
+            '-id'
+        ).values_list('recipe_id', flat=True)[:limit]
+    }
+
+
+def get_recipes_limit(request):
+    """Проверяет recipes_limit и ограничивает его сверху."""
+    value = request.query_params.get('recipes_limit')
+    if value is None:
+        return Constants.MAX_RECIPES_LIMIT
+    try:
+        limit = int(value)
+    except ValueError:
+        limit = 0
+    if limit < 1:
+        raise serializers.ValidationError({
+            'recipes_limit': 'Значение должно быть целым числом больше нуля.'
+        })
+    return min(limit, Constants.MAX_RECIPES_LIMIT)
+
+
+class LimitedRecipeIds(Subquery):
+    """id рецептов с номером строки не больше limit."""
+
+    template = (
+        '(SELECT ranked.id FROM (%(subquery)s) ranked '
+        'WHERE ranked.row_number <= %(limit)d)'
+    )
+
+
+def limited_recipes_prefetch(authors, limit):
+    """
+    Загружает не более limit последних рецептов каждого автора.
+
+    Отбор выполняется в базе данных через ROW_NUMBER() по автору,
+    результат доступен в атрибуте limited_recipes.
+    """
+    ranked = Recipe.objects.filter(author__in=authors).annotate(
+        row_number=Window(
+            expression=RowNumber(),
+            partition_by=F('author'),
+            order_by=(F('pub_date').desc(), F('id').desc())
+        )
+    ).order_by().values('id', 'row_number')
+    return Prefetch(
+        'recipes',
+        queryset=Recipe.objects.filter(
+            pk__in=LimitedRecipeIds(ranked, limit=int(limit))
+        ).order_by('-pub_date', '-id'),
+        to_attr='limited_recipes'
+    )
+
+
+class Echo:
+    """Буфер, который сразу возвращает записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def shopping_list_text(items):
+    """Построчно генерирует текст списка покупок."""
+    yield 'Список покупок:\n'
+    for item in items:
+        yield (
             f'{item["name"]} '
             f'{item["measurement_unit"]} - '
             f'{item["total_amount"]}\n'
         )
-    return ''.join(lines)
+
+
+def shopping_list_csv(items):
+    """Построчно генерирует список покупок в CSV."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'measurement_unit', 'total_amount'))
+    for item in items:
+        yield writer.writerow((
+            item['name'], item['measurement_unit'], item['total_amount']
+        ))
+
+
+def shopping_list_json(items):
+    """Поэлементно генерирует список покупок в JSON."""
+    separator = '['
+    for item in items:
+        yield separator + json.dumps({
+            'name': item['name'],
+            'measurement_unit': item['measurement_unit'],
+            'total_amount': item['total_amount'],
+        }, ensure_ascii=False)
+        separator = ','
+    yield '[]' if separator == '[' else ']'
+
+
+SHOPPING_LIST_FORMATS = {
+    'txt': shopping_list_text,
+    'csv': shopping_list_csv,
+    'json': shopping_list_json,
+}
+
+
+def shopping_list_etag(user_id, file_format):
+    """ETag списка покупок без обращения к базе данных."""
+    return quote_etag(md5(
+        f'{file_format}:{get_shopping_cart_version(user_id)}:'
+        f'{get_version(INGREDIENT_INDEX_KEY)}'.encode()
+    ).hexdigest())
@@ -0,0 +1,94 @@
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from api.cache import (bump_generation, bump_version, invalidate_author,
+                       invalidate_recipes)
+from api.images import schedule_renditions
+from api.indexes import INGREDIENT_INDEX_KEY
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=Recipe)
+def invalidate_recipe(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_recipes(instance.pk)
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def invalidate_recipe_ingredient(sender, instance, **kwargs):
+    invalidate_recipes(instance.recipe_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags(sender, instance, action, reverse, pk_set,
+                           **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        invalidate_recipes(instance.pk)
+    elif pk_set is not None:
+        invalidate_recipes(*pk_set)
+    else:
+        bump_generation()
+
+
+@receiver(post_save, sender=User)
+def invalidate_user(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    invalidate_author(instance.pk)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_reference(sender, **kwargs):
+    bump_generation()
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredient_index(sender, **kwargs):
+    bump_version(INGREDIENT_INDEX_KEY)
+
+
+def mark_recipe_renditions(pk, name):
+    """Отмечает, что копии изображения рецепта построены."""
+    if Recipe.objects.filter(pk=pk, image=name).exclude(
+        image_rendered=name
+    ).update(image_rendered=name):
+        invalidate_recipes(pk)
+
+
+def mark_avatar_renditions(pk, name):
+    """Отмечает, что копии аватара построены."""
+    if User.objects.filter(pk=pk, avatar=name).exclude(
+        avatar_rendered=name
+    ).update(avatar_rendered=name):
+        invalidate_author(pk)
+
+
+@receiver(post_save, sender=Recipe)
+def build_recipe_renditions(sender, instance, **kwargs):
+    transaction.on_commit(partial(
+        schedule_renditions, instance.image, 'recipe',
+        partial(mark_recipe_renditions, instance.pk, instance.image.name)
+    ))
+
+
+@receiver(post_save, sender=User)
+def build_avatar_renditions(sender, instance, update_fields, **kwargs):
+    if update_fields is not None and 'avatar' not in update_fields:
+        return
+    transaction.on_commit(partial(
+        schedule_renditions, instance.avatar, 'avatar',
+        partial(mark_avatar_renditions, instance.pk, instance.avatar.name)
+    ))
@@ -0,0 +1,690 @@
+import base64
+import json
+import os
+from io import BytesIO, StringIO
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+
+from api.images import schedule_renditions
+from api.indexes import get_recipe_ingredient_index
+from recipes.models import (FeedEntry, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, ShoppingCartIngredient, Tag)
+from recipes.services import (calculate_shopping_cart_totals,
+                              log_recipe_ingredients)
+from users.models import Follow, User
+
+RECIPES_COUNT = 600
+INGREDIENTS_PER_RECIPE = 3
+RECIPE_LIST_QUERIES = 5
+USER_RECIPE_LIST_QUERIES = 6
+RECIPE_DETAIL_QUERIES = 4
+USER_RECIPE_DETAIL_QUERIES = 5
+SUBSCRIPTIONS_QUERIES = 3
+RECIPE_CREATE_QUERIES = 17
+
+
+class TemporaryMediaMixin:
+    """Сохраняет загруженные файлы во временный каталог."""
+
+    def setUp(self):
+        super().setUp()
+        media = TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_settings = override_settings(
+            MEDIA_ROOT=media.name, IMAGE_WORKERS=0
+        )
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+
+def png_image(size=(640, 480)):
+    data = BytesIO()
+    Image.new('RGB', size, 'red').save(data, 'PNG')
+    return data.getvalue()
+
+
+class RecipeListQueriesTest(TestCase):
+    """Число запросов чтения рецептов не зависит от размера страницы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='reader@example.com', username='reader',
+            first_name='Читатель', last_name='Рецептов', password='pass'
+        )
+        authors = [
+            User.objects.create(
+                email=f'author{number}@example.com',
+                username=f'author{number}',
+                first_name='Автор', last_name=str(number)
+            )
+            for number in range(10)
+        ]
+        tags = [
+            Tag.objects.create(name=f'Тег {number}', slug=f'tag{number}')
+            for number in range(3)
+        ]
+        ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {number}', measurement_unit='г'
+            )
+            for number in range(20)
+        ]
+        Recipe.objects.bulk_create([
+            Recipe(author=authors[number % len(authors)],
+                   name=f'Рецепт {number}', text='Описание',
+                   cooking_time=10, image='recipes/test.png')
+            for number in range(RECIPES_COUNT)
+        ])
+        recipes = Recipe.objects.order_by('id')
+        Recipe.tags.through.objects.bulk_create([
+            Recipe.tags.through(recipe=recipe, tag=tag)
+            for number, recipe in enumerate(recipes)
+            for tag in tags[:number % len(tags) + 1]
+        ])
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(
+                recipe=recipe,
+                ingredient=ingredients[(number + offset) % len(ingredients)],
+                amount=offset + 1
+            )
+            for number, recipe in enumerate(recipes)
+            for offset in range(INGREDIENTS_PER_RECIPE)
+        ])
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = APIClient()
+        self.user_client = APIClient()
+        self.user_client.force_authenticate(self.user)
+
+    def assert_list_queries(self, client, queries):
+        for limit in (6, 60, 600):
+            with self.subTest(limit=limit):
+                cache.clear()
+                with self.assertNumQueries(queries):
+                    response = client.get('/api/recipes/', {'limit': limit})
+                self.assertEqual(response.status_code, 200)
+                results = response.json()['results']
+                self.assertEqual(len(results), limit)
+                self.assertEqual(
+                    len(results[-1]['ingredients']), INGREDIENTS_PER_RECIPE
+                )
+
+    def test_guest_recipe_list_queries(self):
+        self.assert_list_queries(self.guest_client, RECIPE_LIST_QUERIES)
+
+    def test_user_recipe_list_queries(self):
+        self.assert_list_queries(self.user_client, USER_RECIPE_LIST_QUERIES)
+
+    def test_recipe_detail_queries(self):
+        recipe = Recipe.objects.order_by('id').last()
+        for client, queries in (
+            (self.guest_client, RECIPE_DETAIL_QUERIES),
+            (self.user_client, USER_RECIPE_DETAIL_QUERIES),
+        ):
+            with self.subTest(queries=queries):
+                cache.clear()
+                with self.assertNumQueries(queries):
+                    response = client.get(f'/api/recipes/{recipe.id}/')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    len(response.json()['ingredients']),
+                    INGREDIENTS_PER_RECIPE
+                )
+
+    def test_subscriptions_queries(self):
+        Follow.objects.bulk_create([
+            Follow(user=self.user, author=author)
+            for author in User.objects.exclude(pk=self.user.pk)
+        ])
+        for limit, recipes_limit in ((1, 1), (10, 3), (10, 60)):
+            with self.subTest(limit=limit, recipes_limit=recipes_limit):
+                cache.clear()
+                with self.assertNumQueries(SUBSCRIPTIONS_QUERIES):
+                    response = self.user_client.get(
+                        '/api/users/subscriptions/',
+                        {'limit': limit, 'recipes_limit': recipes_limit}
+                    )
+                self.assertEqual(response.status_code, 200)
+                results = response.json()['results']
+                self.assertEqual(len(results), limit)
+                self.assertEqual(len(results[-1]['recipes']), recipes_limit)
+
+
+class RecipeFragmentsTest(TestCase):
+    """Изменение рецепта сразу видно в списке и в карточке."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='Автор', last_name='Рецептов', password='pass'
+        )
+        cls.tag = Tag.objects.create(name='Завтрак', slug='breakfast')
+        cls.salt, cls.sugar = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('Соль', 'Сахар')
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.author, name='Каша', text='Описание',
+            cooking_time=10, image='recipes/test.png'
+        )
+        cls.recipe.tags.set([cls.tag])
+        RecipeIngredient.objects.create(
+            recipe=cls.recipe, ingredient=cls.salt, amount=5
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def get_representations(self):
+        results = self.client.get('/api/recipes/').json()['results']
+        detail = self.client.get(f'/api/recipes/{self.recipe.id}/').json()
+        return results[0], detail
+
+    def test_edit_is_visible(self):
+        self.get_representations()
+        response = self.client.patch(
+            f'/api/recipes/{self.recipe.id}/',
+            {
+                'name': 'Сладкая каша',
+                'text': 'Описание',
+                'cooking_time': 10,
+                'tags': [self.tag.id],
+                'ingredients': [{'id': self.sugar.id, 'amount': 20}],
+            },
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['name'], 'Сладкая каша')
+        for representation in self.get_representations():
+            self.assertEqual(representation['name'], 'Сладкая каша')
+            self.assertEqual(
+                [(ingredient['id'], ingredient['amount'])
+                 for ingredient in representation['ingredients']],
+                [(self.sugar.id, 20)]
+            )
+
+
+class RecipeIngredientIndexTest(TestCase):
+    """Индекс состава перестраивается после очистки кэша."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(
+            email='author@example.com', username='author',
+            first_name='Автор', last_name='Рецептов'
+        )
+        cls.salt, cls.sugar = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('Соль', 'Сахар')
+        )
+        cls.recipe = Recipe.objects.create(
+            author=author, name='Каша', text='Описание',
+            cooking_time=10, image='recipes/test.png'
+        )
+
+    def add_ingredient(self, ingredient):
+        with self.captureOnCommitCallbacks(execute=True):
+            RecipeIngredient.objects.create(
+                recipe=self.recipe, ingredient=ingredient, amount=5
+            )
+            log_recipe_ingredients([(self.recipe.id, ingredient.id)])
+
+    def filter_recipes(self, ingredient):
+        return list(get_recipe_ingredient_index().filter(
+            Recipe.objects.all(), include=[ingredient.id]
+        ))
+
+    def test_index_is_rebuilt_after_cache_clear(self):
+        cache.clear()
+        self.add_ingredient(self.salt)
+        self.assertEqual(self.filter_recipes(self.salt), [self.recipe])
+        cache.clear()
+        self.add_ingredient(self.sugar)
+        self.assertEqual(self.filter_recipes(self.sugar), [self.recipe])
+
+
+@override_settings(FEED_WORKERS=0, FEED_PULL_FOLLOWERS=2)
+class FeedTest(TransactionTestCase):
+    """Лента подписок с рассылкой и чтением рецептов напрямую."""
+
+    def setUp(self):
+        cache.clear()
+        self.author, self.reader, self.other = (
+            User.objects.create(
+                email=f'{username}@example.com', username=username,
+                first_name='Имя', last_name='Фамилия'
+            )
+            for username in ('author', 'reader', 'other')
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def create_recipe(self, name):
+        return Recipe.objects.create(
+            author=self.author, name=name, text='Описание', cooking_time=10
+        )
+
+    def get_feed(self):
+        response = self.client.get('/api/users/feed/')
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.json()['results']]
+
+    def test_recipe_is_pushed_to_followers(self):
+        old = self.create_recipe('Старый рецепт')
+        Follow.objects.create(user=self.reader, author=self.author)
+        new = self.create_recipe('Новый рецепт')
+        self.assertEqual(self.get_feed(), [new.id, old.id])
+        self.assertEqual(FeedEntry.objects.filter(user=self.reader).count(), 2)
+
+    def test_former_pull_author_recipes_stay_in_feed(self):
+        old = self.create_recipe('Старый рецепт')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.other, author=self.author)
+        pulled = self.create_recipe('Рецепт автора с чтением напрямую')
+        self.assertFalse(FeedEntry.objects.filter(recipe=pulled).exists())
+        self.assertEqual(self.get_feed(), [pulled.id, old.id])
+        Follow.objects.filter(user=self.other).delete()
+        self.assertEqual(self.get_feed(), [pulled.id, old.id])
+        self.assertTrue(FeedEntry.objects.filter(
+            user=self.reader, recipe=pulled
+        ).exists())
+
+
+class ShoppingCartTotalsTest(TestCase):
+    """Итоги списков покупок совпадают с пересчетом по корзинам."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.first_user, cls.second_user = (
+            User.objects.create(
+                email=f'{username}@example.com', username=username,
+                first_name='Имя', last_name='Фамилия'
+            )
+            for username in ('first', 'second')
+        )
+        cls.salt, cls.sugar = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('Соль', 'Сахар')
+        )
+        cls.soup, cls.porridge = (
+            Recipe.objects.create(
+                author=cls.first_user, name=name, text='Описание',
+                cooking_time=10
+            )
+            for name in ('Суп', 'Каша')
+        )
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(recipe=cls.soup, ingredient=cls.salt, amount=5),
+            RecipeIngredient(
+                recipe=cls.porridge, ingredient=cls.salt, amount=1
+            ),
+            RecipeIngredient(
+                recipe=cls.porridge, ingredient=cls.sugar, amount=20
+            ),
+        ])
+
+    def assert_totals(self, expected):
+        totals = {
+            (row.user_id, row.ingredient_id): row.total_amount
+            for row in ShoppingCartIngredient.objects.all()
+        }
+        self.assertEqual(totals, expected)
+        self.assertEqual(totals, calculate_shopping_cart_totals())
+
+    def test_totals_follow_shopping_cart(self):
+        first, second = self.first_user.id, self.second_user.id
+        ShoppingCart.objects.create(user=self.first_user, recipe=self.soup)
+        item = ShoppingCart.objects.create(
+            user=self.first_user, recipe=self.porridge
+        )
+        self.assert_totals({(first, self.salt.id): 6,
+                            (first, self.sugar.id): 20})
+        item.recipe = self.soup
+        item.user = self.second_user
+        item.save()
+        self.assert_totals({(first, self.salt.id): 5,
+                            (second, self.salt.id): 5})
+        item.delete()
+        self.assert_totals({(first, self.salt.id): 5})
+
+
+class LoadDataTest(TestCase):
+    """Повторная загрузка справочников обновляет существующие записи."""
+
+    def load(self, tags):
+        with TemporaryDirectory() as path:
+            with open(os.path.join(path, 'tags.json'), 'w') as file:
+                json.dump(tags, file)
+            output = StringIO()
+            call_command('load_data', path=path, stdout=output)
+        return output.getvalue()
+
+    def test_reload_with_changed_tag_slug(self):
+        self.load([
+            {'name': 'Завтрак', 'slug': 'breakfast'},
+            {'name': 'Обед', 'slug': 'lunch'},
+            {'name': 'Ужин', 'slug': 'dinner'},
+        ])
+        tags = dict(Tag.objects.values_list('slug', 'pk'))
+        output = self.load([
+            {'name': 'Завтрак', 'slug': 'morning'},
+            {'name': 'Полдник', 'slug': 'lunch'},
+            {'name': 'Ужин', 'slug': 'breakfast'},
+        ])
+        self.assertIn('записано 2, пропущено 1', output)
+        self.assertEqual(
+            set(Tag.objects.values_list('pk', 'name', 'slug')),
+            {(tags['breakfast'], 'Завтрак', 'morning'),
+             (tags['lunch'], 'Полдник', 'lunch'),
+             (tags['dinner'], 'Ужин', 'dinner')}
+        )
+
+
+class RecipeRenditionTest(TemporaryMediaMixin, TestCase):
+    """Уменьшенная копия отдается после ее построения."""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.author = User.objects.create(
+            email='author@example.com', username='author',
+            first_name='Автор', last_name='Рецептов'
+        )
+
+    def test_thumbnail_after_renditions(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            recipe = Recipe.objects.create(
+                author=self.author, name='Каша', text='Описание',
+                cooking_time=10,
+                image=SimpleUploadedFile('porridge.png', png_image())
+            )
+        url = f'/api/recipes/{recipe.id}/'
+        with mock.patch.object(
+            FileSystemStorage, 'exists', side_effect=AssertionError
+        ):
+            detail = self.client.get(url).json()
+            self.assertEqual(detail['thumbnail'], detail['image'])
+            for callback in callbacks:
+                if getattr(callback, 'func', None) is schedule_renditions:
+                    callback()
+            detail = self.client.get(url).json()
+        self.assertRegex(detail['thumbnail'], r'/renditions/card/.+\.webp$')
+
+
+class RecipeCreateQueriesTest(TemporaryMediaMixin, TestCase):
+    """Число запросов создания рецепта не зависит от числа ингредиентов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            email='author@example.com', username='author',
+            first_name='Автор', last_name='Рецептов'
+        )
+        cls.tags = [
+            Tag.objects.create(name=f'Тег {number}', slug=f'tag{number}')
+            for number in range(3)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {number}', measurement_unit='г'
+            )
+            for number in range(30)
+        ]
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+        self.image = 'data:image/png;base64,' + base64.b64encode(
+            png_image((4, 4))
+        ).decode()
+
+    def test_create_queries(self):
+        for count in (3, 30):
+            with self.subTest(ingredients=count):
+                cache.clear()
+                with self.assertNumQueries(RECIPE_CREATE_QUERIES):
+                    response = self.client.post('/api/recipes/', {
+                        'name': f'Рецепт из {count} ингредиентов',
+                        'text': 'Описание',
+                        'cooking_time': 10,
+                        'image': self.image,
+                        'tags': [tag.id for tag in self.tags],
+                        'ingredients': [
+                            {'id': ingredient.id, 'amount': 5}
+                            for ingredient in self.ingredients[:count]
+                        ],
+                    }, format='json')
+                self.assertEqual(response.status_code, 201)
+                self.assertEqual(len(response.json()['ingredients']), count)
+
+
+class RecipeUpdateTest(TestCase):
+    """Обновление состава рецепта меняет только изменившиеся строки."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            email='author@example.com', username='author',
+            first_name='Автор', last_name='Рецептов'
+        )
+        cls.tag = Tag.objects.create(name='Завтрак', slug='breakfast')
+        cls.salt, cls.sugar, cls.milk, cls.oats = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('Соль', 'Сахар', 'Молоко', 'Овсянка')
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.author, name='Каша', text='Описание',
+            cooking_time=10, image='recipes/test.png'
+        )
+        cls.recipe.tags.set([cls.tag])
+        cls.rows = {
+            row.ingredient_id: row
+            for row in RecipeIngredient.objects.bulk_create([
+                RecipeIngredient(
+                    recipe=cls.recipe, ingredient=ingredient, amount=amount
+                )
+                for ingredient, amount in (
+                    (cls.salt, 5), (cls.sugar, 20), (cls.milk, 200)
+                )
+            ])
+        }
+        ShoppingCart.objects.create(user=cls.author, recipe=cls.recipe)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def test_update_ingredients_diff(self):
+        rows = {
+            row.ingredient_id: row.pk
+            for row in RecipeIngredient.objects.filter(recipe=self.recipe)
+        }
+        response = self.client.patch(
+            f'/api/recipes/{self.recipe.id}/',
+            {
+                'name': 'Каша',
+                'text': 'Описание',
+                'cooking_time': 10,
+                'tags': [self.tag.id],
+                'ingredients': [
+                    {'id': self.salt.id, 'amount': 5},
+                    {'id': self.sugar.id, 'amount': 10},
+                    {'id': self.oats.id, 'amount': 50},
+                ],
+            },
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        updated = {
+            row.ingredient_id: (row.pk, row.amount)
+            for row in RecipeIngredient.objects.filter(recipe=self.recipe)
+        }
+        self.assertEqual(updated[self.salt.id], (rows[self.salt.id], 5))
+        self.assertEqual(updated[self.sugar.id], (rows[self.sugar.id], 10))
+        self.assertEqual(updated[self.oats.id][1], 50)
+        self.assertNotIn(self.milk.id, updated)
+        self.assertEqual(
+            dict(ShoppingCartIngredient.objects.filter(
+                user=self.author
+            ).values_list('ingredient_id', 'total_amount')),
+            {self.salt.id: 5, self.sugar.id: 10, self.oats.id: 50}
+        )
+
+
+class ShoppingListTest(TestCase):
+    """Список покупок отдает ETag и 304 без изменений корзины."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            email='buyer@example.com', username='buyer',
+            first_name='Покупатель', last_name='Продуктов'
+        )
+        salt = Ingredient.objects.create(name='Соль', measurement_unit='г')
+        cls.soup, cls.porridge = (
+            Recipe.objects.create(
+                author=cls.user, name=name, text='Описание',
+                cooking_time=10, image='recipes/test.png'
+            )
+            for name in ('Суп', 'Каша')
+        )
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(recipe=recipe, ingredient=salt, amount=5)
+            for recipe in (cls.soup, cls.porridge)
+        ])
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def download(self, **headers):
+        return self.client.get(
+            '/api/recipes/download_shopping_cart/', {'format': 'csv'},
+            **headers
+        )
+
+    def test_not_modified(self):
+        ShoppingCart.objects.create(user=self.user, recipe=self.soup)
+        response = self.download()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Соль,г,5', b''.join(
+            response.streaming_content
+        ).decode())
+        etag = response['ETag']
+        response = self.download(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                f'/api/recipes/{self.porridge.id}/shopping_cart/'
+            )
+        self.assertEqual(response.status_code, 201)
+        response = self.download(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('Соль,г,10', b''.join(
+            response.streaming_content
+        ).decode())
+
+
+@override_settings(FEED_WORKERS=0)
+class ShortLinkTest(TransactionTestCase):
+    """Короткая ссылка ведет на существующий рецепт."""
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create(
+            email='author@example.com', username='author',
+            first_name='Автор', last_name='Рецептов'
+        )
+
+    def create_recipe(self):
+        return Recipe.objects.create(
+            author=self.author, name='Каша', text='Описание', cooking_time=10
+        )
+
+    def test_short_link(self):
+        recipe = self.create_recipe()
+        link = APIClient().get(
+            f'/api/recipes/{recipe.id}/get-link/'
+        ).json()['short-link']
+        response = self.client.get(link)
+        self.assertEqual(response.status_code, 301)
+        self.assertTrue(response['Location'].endswith(f'/recipes/{recipe.id}'))
+        new_recipe = self.create_recipe()
+        recipe.delete()
+        self.assertEqual(self.client.get(link).status_code, 404)
+        response = self.client.get(APIClient().get(
+            f'/api/recipes/{new_recipe.id}/get-link/'
+        ).json()['short-link'])
+        self.assertEqual(response.status_code, 301)
+        self.assertEqual(self.client.get('/s/zzzzzz/').status_code, 404)
+        self.assertEqual(self.client.get('/s/-/').status_code, 400)
+
+
+class PantryMatchTest(TestCase):
+    """Подбор рецептов по имеющимся ингредиентам."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(
+            email='author@example.com', username='author',
+            first_name='Автор', last_name='Рецептов'
+        )
+        cls.salt, cls.sugar, cls.pepper = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('Соль', 'Сахар', 'Перец')
+        )
+        cls.recipes = {}
+        for name, ingredients in (
+            ('Сладкая каша', (cls.salt, cls.sugar)),
+            ('Соленая каша', (cls.salt,)),
+            ('Перцовка', (cls.pepper,)),
+        ):
+            recipe = cls.recipes[name] = Recipe.objects.create(
+                author=author, name=name, text='Описание',
+                cooking_time=10, image='recipes/test.png'
+            )
+            RecipeIngredient.objects.bulk_create([
+                RecipeIngredient(
+                    recipe=recipe, ingredient=ingredient, amount=1
+                )
+                for ingredient in ingredients
+            ])
+
+    def setUp(self):
+        cache.clear()
+
+    def match(self, **params):
+        response = APIClient().get('/api/recipes/pantry-match/', params)
+        self.assertEqual(response.status_code, 200)
+        return [
+            (item['id'], item['coverage'],
+             [ingredient['id'] for ingredient in item['missing_ingredients']])
+            for item in response.json()['results']
+        ]
+
+    def test_pantry_match(self):
+        self.assertEqual(self.match(ingredients=str(self.salt.id)), [
+            (self.recipes['Соленая каша'].id, 1.0, []),
+            (self.recipes['Сладкая каша'].id, 0.5, [self.sugar.id]),
+        ])
+        self.assertEqual(
+            self.match(ingredients=str(self.salt.id), max_missing=0),
+            [(self.recipes['Соленая каша'].id, 1.0, [])]
+        )
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+
+
+class LimitedTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """
+    Пишет загружаемый файл во временный файл по частям.
+
+    Сверх IMAGE_MAX_BYTES данные не сохраняются, но учитываются в размере
+    файла, чтобы сериализатор вернул понятную ошибку.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received <= settings.IMAGE_MAX_BYTES:
+            self.file.write(raw_data)
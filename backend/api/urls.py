@@ -1,6 +1,7 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
+from api.async_views import async_read_patterns
 from api.views import (IngredientsViewSet, RecipesViewSet, TagsViewSet,
                        UserViewSet)
 
@@ -13,5 +14,8 @@ router.register('recipes', RecipesViewSet, basename='recipes')
 
 urlpatterns = [
     path('auth/', include('djoser.urls.authtoken')),
-    path('', include(router.urls)),
+    path('', include(async_read_patterns(router.urls, (
+        'recipes-list', 'recipes-detail', 'tags-list', 'tags-detail',
+        'ingredients-list', 'ingredients-detail',
+    )))),
 ]
@@ -1,26 +1,43 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Count, Exists, F, OuterRef, Sum
-from django.http import FileResponse
+from django.db import transaction
+from django.db.models import F, Sum, prefetch_related_objects
+from django.http import Http404, HttpResponseNotModified, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.urls import reverse
-from django.utils.http import int_to_base36
+from django.utils.cache import patch_cache_control
+from django.utils.http import int_to_base36, parse_etags
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet as DjoserViewSet
 from rest_framework import filters, permissions, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 
 from api.filters import RecipesFilter
+from api.indexes import get_ingredient_index, get_recipe_ingredient_index
+from api.pagination import (FeedCursorPagination, PageNumberLimitPagination,
+                            RecipePagination, SubscriptionPagination)
 from api.permissions import IsAuthorOrReadOnly
+from api.renderers import CSVRenderer, PlainTextRenderer
 from api.serializers import (AvatarSerializer, FavoriteSerializer,
-                             IngredientsSerializer, RecipeReadSerializer,
-                             RecipeWriteSerializer, ShoppingCartSerializer,
+                             IngredientsSerializer, PantryMatchQuerySerializer,
+                             RecipeReadSerializer, RecipeWriteSerializer,
+                             ShoppingCartSerializer,
                              SubscriptionCreateSerializer,
                              SubscriptionSerializer, TagsSerializer,
                              UserDetailSerializer)
-from api.services import generate_shoping_list
-from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                            ShoppingCart, Tag)
+from api.services import (SHOPPING_LIST_FORMATS, annotate_is_subscribed,
+                          annotate_recipe_flags, get_recipes_limit,
+                          get_user_recipe_ids, limited_recipes_prefetch,
+                          shopping_list_etag)
+from recipes.feed import feed_sources
+from recipes.models import (Favorite, Ingredient, Recipe, ShoppingCart,
+                            ShoppingCartIngredient, SimilarRecipe, Tag)
+from recipes.popularity import get_popular_recipe_ids
+from recipes.services import recipe_exists
+from recipes.similarity import find_similar_by_ingredients
 from users.models import Follow
 
 User = get_user_model()
@@ -29,12 +46,18 @@ User = get_user_model()
 class UserViewSet(DjoserViewSet):
     """Вьюсет для объектов пользователя."""
 
-    queryset = User.objects.all().prefetch_related('recipes')
+    queryset = User.objects.all()
     filter_backends = (DjangoFilterBackend, filters.OrderingFilter)
     search_fields = ('username',)
+    ordering = ('username',)
     lookup_field = 'id'
     http_method_names = ('get', 'post', 'put', 'delete', 'head', 'options')
 
+    def get_queryset(self):
+        return annotate_is_subscribed(
+            super().get_queryset(), self.request.user
+        )
+
     @action(
         detail=False,
         methods=('get',),
@@ -73,9 +96,7 @@ class UserViewSet(DjoserViewSet):
         serializer_class=SubscriptionCreateSerializer
     )
     def subscribe(self, request, id=None):
-        author = get_object_or_404(
-            User.objects.prefetch_related('recipes'), pk=id
-        )
+        author = get_object_or_404(User, pk=id)
         serializer = SubscriptionCreateSerializer(
             data={'author': author.id},
             context={'request': request}
@@ -101,20 +122,50 @@ class UserViewSet(DjoserViewSet):
         methods=('get',),
         url_path='subscriptions',
         permission_classes=(permissions.IsAuthenticated,),
-        serializer_class=SubscriptionSerializer
+        serializer_class=SubscriptionSerializer,
+        pagination_class=SubscriptionPagination
     )
     def subscriptions(self, request):
-        subscribed_authors_qs = (
+        subscribed_authors_qs = annotate_is_subscribed(
             User.objects.filter(subscriptions_to_author__user=request.user)
-            .annotate(recipes_count=Count('recipes'))
-            .order_by('username').prefetch_related('recipes')
+            .order_by('username'),
+            request.user
         )
         page = self.paginate_queryset(subscribed_authors_qs)
-        serializer = self.get_serializer(
-            page if page is not None else subscribed_authors_qs, many=True
-        )
+        limit = get_recipes_limit(request)
+        if page:
+            prefetch_related_objects(
+                page, limited_recipes_prefetch(page, limit)
+            )
+        serializer = self.get_serializer(page, many=True)
         return self.get_paginated_response(serializer.data)
 
+    @action(
+        detail=False,
+        methods=('get',),
+        url_path='feed',
+        permission_classes=(permissions.IsAuthenticated,),
+        pagination_class=FeedCursorPagination
+    )
+    def feed(self, request):
+        """
+        Новые рецепты авторов, на которых подписан пользователь.
+
+        Рецепты большинства авторов читаются из ленты пользователя,
+        рецепты самых популярных и плодовитых - напрямую из рецептов.
+        """
+        ids = self.paginator.paginate_sources(
+            feed_sources(request.user), request
+        )
+        recipes = annotate_recipe_flags(
+            Recipe.objects.all(), request.user
+        ).in_bulk(ids)
+        return self.get_paginated_response(RecipeReadSerializer(
+            [recipes[pk] for pk in ids if pk in recipes],
+            many=True,
+            context=self.get_serializer_context()
+        ).data)
+
 
 class TagsViewSet(viewsets.ReadOnlyModelViewSet):
     """Вьюсет для тегов."""
@@ -125,13 +176,26 @@ class TagsViewSet(viewsets.ReadOnlyModelViewSet):
 
 
 class IngredientsViewSet(viewsets.ReadOnlyModelViewSet):
-    """Вьюсет для тегов."""
+    """
+    Вьюсет для ингредиентов.
+
+    Поиск по началу названия обслуживается индексом в памяти процесса.
+    """
 
     queryset = Ingredient.objects.all()
     serializer_class = IngredientsSerializer
     pagination_class = None
-    filter_backends = (filters.SearchFilter,)
-    search_fields = ('^name',)
+
+    def list(self, request):
+        try:
+            limit = int(request.query_params.get('limit'))
+        except (TypeError, ValueError):
+            limit = None
+        if limit is not None and limit < 1:
+            limit = None
+        return Response(get_ingredient_index().search(
+            request.query_params.get(api_settings.SEARCH_PARAM, ''), limit
+        ))
 
 
 class RecipesViewSet(viewsets.ModelViewSet):
@@ -140,22 +204,14 @@ class RecipesViewSet(viewsets.ModelViewSet):
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipesFilter
     permission_classes = (IsAuthorOrReadOnly,)
+    pagination_class = RecipePagination
 
     def get_queryset(self):
-        user = self.request.user
-        queryset = (
-            Recipe.objects.select_related('author')
-            .prefetch_related('tags', 'ingredients')
+        queryset = annotate_recipe_flags(
+            Recipe.objects.all(), self.request.user
         )
-        if user.is_authenticated:
-            return queryset.annotate(
-                is_favorited=Exists(Favorite.objects.filter(
-                    recipe=OuterRef('pk'), user=user
-                )),
-                is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
-                    recipe=OuterRef('pk'), user=user
-                )),
-            ).order_by('-is_favorited', '-is_in_shopping_cart')
+        if self.request.user.is_authenticated:
+            return queryset.order_by('-is_favorited', '-is_in_shopping_cart')
         return queryset
 
     def get_serializer_class(self):
@@ -178,24 +234,177 @@ class RecipesViewSet(viewsets.ModelViewSet):
     @action(
         detail=False,
         methods=('get',),
-        url_path='download_shopping_cart',
+        url_path='pantry-match',
+        pagination_class=PageNumberLimitPagination
+    )
+    def pantry_match(self, request):
+        """
+        Рецепты, отсортированные по доле имеющихся ингредиентов.
+
+        Для каждого рецепта возвращаются покрытие и недостающие
+        ингредиенты.
+        """
+        query = PantryMatchQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        pantry = query.validated_data['ingredients']
+        page = self.paginate_queryset(
+            get_recipe_ingredient_index().match_pantry(
+                pantry, query.validated_data.get('max_missing')
+            )
+        )
+        recipes = self.get_queryset().in_bulk(
+            [match['id'] for match in page]
+        )
+        matches = [match for match in page if match['id'] in recipes]
+        data = RecipeReadSerializer(
+            [recipes[match['id']] for match in matches],
+            many=True,
+            context=self.get_serializer_context()
+        ).data
+        for item, match in zip(data, matches):
+            item['coverage'] = round(match['matched'] / match['size'], 3)
+            item['missing_ingredients'] = [
+                ingredient for ingredient in item['ingredients']
+                if ingredient['id'] not in pantry
+            ]
+        return self.get_paginated_response(data)
+
+    def list_recipes(self, queryset):
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(
+            self.get_serializer(page, many=True).data
+        )
+
+    def list_recipe_ids(self, ids):
+        """Выдает страницу рецептов из готового списка id по порядку."""
+        page = self.paginate_queryset(ids)
+        recipes = self.get_queryset().in_bulk(page)
+        return self.get_paginated_response(self.get_serializer(
+            [recipes[pk] for pk in page if pk in recipes], many=True
+        ).data)
+
+    @action(
+        detail=True,
+        methods=('get',),
+        url_path='similar',
+        pagination_class=PageNumberLimitPagination
+    )
+    def similar(self, request, pk=None):
+        """
+        Похожие рецепты из таблицы, построенной build_similar_recipes.
+
+        Для рецептов без добавлений в избранное и покупки похожие
+        подбираются по составу через LSH-индекс сигнатур ингредиентов.
+        """
+        try:
+            recipe_id = int(pk)
+        except ValueError:
+            raise Http404
+        if not recipe_exists(recipe_id):
+            raise Http404
+        if SimilarRecipe.objects.filter(recipe_id=recipe_id).exists():
+            return self.list_recipes(
+                self.get_queryset()
+                .filter(similar_to__recipe_id=recipe_id)
+                .order_by('-similar_to__score', '-id')
+            )
+        page = self.paginate_queryset(find_similar_by_ingredients(
+            Recipe.objects.filter(pk=recipe_id).values_list(
+                'ingredients_signature', flat=True
+            ).first(),
+            exclude_id=recipe_id
+        ))
+        recipes = self.get_queryset().in_bulk(
+            [similar_id for _, similar_id in page]
+        )
+        return self.get_paginated_response(self.get_serializer([
+            recipes[similar_id] for _, similar_id in page
+            if similar_id in recipes
+        ], many=True).data)
+
+    @action(
+        detail=False,
+        methods=('get',),
+        url_path='recommended',
         permission_classes=(permissions.IsAuthenticated,),
-        pagination_class=None
+        pagination_class=PageNumberLimitPagination
     )
-    def download_shopping_cart(self, request):
-        ingredients = (
-            RecipeIngredient.objects
-            .filter(recipe__shopping_carts__user=request.user)
-            .values(name=F('ingredient__name'),
-                    measurement_unit=F('ingredient__measurement_unit'))
-            .annotate(total_amount=Sum('amount')).order_by('name')
+    def recommended(self, request):
+        """
+        Рецепты, похожие на избранное и список покупок пользователя.
+
+        Сходство с несколькими рецептами пользователя суммируется.
+        Пользователю без истории выдаются популярные рецепты
+        из кэшированного рейтинга популярности.
+        """
+        sources = get_user_recipe_ids(request.user)
+        if not sources:
+            return self.list_recipe_ids(get_popular_recipe_ids(()))
+        return self.list_recipes(
+            self.get_queryset().exclude(pk__in=sources).filter(
+                similar_to__recipe_id__in=sources
+            ).annotate(
+                recommendation_score=Sum('similar_to__score')
+            ).order_by('-recommendation_score', '-pub_date', '-id')
         )
-        text_content = generate_shoping_list(ingredients)
-        return FileResponse(
-            text_content, as_attachment=True, filename='shopping_list.txt',
-            content_type='text/plain; charset=utf-8'
+
+    @action(
+        detail=False,
+        methods=('get',),
+        url_path='popular',
+        pagination_class=PageNumberLimitPagination
+    )
+    def popular(self, request):
+        """
+        Рецепты по рейтингу добавлений в избранное и список покупок.
+
+        Рейтинг затухает со временем, фильтр - по slug тегов.
+        """
+        response = self.list_recipe_ids(
+            get_popular_recipe_ids(request.query_params.getlist('tags'))
         )
+        if not request.user.is_authenticated:
+            patch_cache_control(
+                response, public=True, max_age=settings.POPULAR_CACHE_TIMEOUT
+            )
+        return response
+
+    @action(
+        detail=False,
+        methods=('get',),
+        url_path='download_shopping_cart',
+        permission_classes=(permissions.IsAuthenticated,),
+        pagination_class=None,
+        renderer_classes=(PlainTextRenderer, CSVRenderer, JSONRenderer)
+    )
+    def download_shopping_cart(self, request):
+        renderer = request.accepted_renderer
+        etag = shopping_list_etag(request.user.id, renderer.format)
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponseNotModified()
+        else:
+            ingredients = (
+                ShoppingCartIngredient.objects
+                .filter(user=request.user)
+                .values('total_amount',
+                        name=F('ingredient__name'),
+                        measurement_unit=F('ingredient__measurement_unit'))
+                .order_by('name')
+            )
+            response = StreamingHttpResponse(
+                SHOPPING_LIST_FORMATS[renderer.format](
+                    ingredients.iterator()
+                ),
+                content_type=f'{renderer.media_type}; charset=utf-8'
+            )
+            response['Content-Disposition'] = (
+                f'attachment; filename="shopping_list.{renderer.format}"'
+            )
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
 
+    @transaction.atomic
     def create_relation(self, request, serializer_cls, pk):
         data = {'user': request.user.id, 'recipe': pk}
         serializer = serializer_cls(data=data, context={'request': request})
@@ -203,6 +412,7 @@ class RecipesViewSet(viewsets.ModelViewSet):
         serializer.save()
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    @transaction.atomic
     def delete_relation(self, request, model, pk):
         deleted, _ = model.objects.filter(
             user=request.user, recipe=pk
@@ -74,6 +74,55 @@ DATABASES = {
         }
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+FRAGMENT_CACHE_TIMEOUT = int(os.getenv('FRAGMENT_CACHE_TIMEOUT', 60 * 60))
+
+INGREDIENT_INDEX_TTL = int(os.getenv('INGREDIENT_INDEX_TTL', 5 * 60))
+
+SHORT_LINK_CACHE_TIMEOUT = int(
+    os.getenv('SHORT_LINK_CACHE_TIMEOUT', 24 * 60 * 60)
+)
+
+RECIPE_IDS_LOG_TIMEOUT = 24 * 60 * 60
+
+RECIPE_IDS_LOG_LIMIT = 1000
+
+RECIPE_INGREDIENTS_LOG_TIMEOUT = 24 * 60 * 60
+
+RECIPE_INGREDIENTS_LOG_LIMIT = 1000
+
+FEED_WORKERS = int(os.getenv('FEED_WORKERS', 2))
+
+FEED_PULL_FOLLOWERS = int(os.getenv('FEED_PULL_FOLLOWERS', 10000))
+
+FEED_PULL_RECIPES = int(os.getenv('FEED_PULL_RECIPES', 1000))
+
+FEED_FANOUT_BATCH_SIZE = 1000
+
+FEED_BACKFILL_SIZE = 20
+
+POPULARITY_HALF_LIFE = int(
+    os.getenv('POPULARITY_HALF_LIFE', 7 * 24 * 60 * 60)
+)
+
+POPULARITY_WEIGHTS = {'favorite': 1.0, 'shoppingcart': 0.5}
+
+POPULARITY_MIN_SCORE = 0.01
+
+POPULAR_CACHE_TIMEOUT = int(os.getenv('POPULAR_CACHE_TIMEOUT', 60))
+
+ASYNC_READ_VIEWS = os.getenv('ASYNC_READ_VIEWS', False) == 'True'
+
+ASYNC_READ_THREADS = int(os.getenv('ASYNC_READ_THREADS', 8))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -139,4 +188,23 @@ DJOSER = {
     }
 }
 
+IMAGE_MAX_BYTES = 10 * 1024 * 1024
+
+IMAGE_MAX_SIDE = 8000
+
+IMAGE_MAX_PIXELS = 40_000_000
+
+IMAGE_RENDITION_FORMAT = 'WEBP'
+
+IMAGE_RENDITIONS = {
+    'recipe': {'card': (480, 320)},
+    'avatar': {'avatar': (120, 120)},
+}
+
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+
+FILE_UPLOAD_HANDLERS = [
+    'api.uploadhandlers.LimitedTemporaryFileUploadHandler',
+]
+
 JSON_FILES_DIR = os.path.join(BASE_DIR, 'data/')
@@ -3,13 +3,16 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from api.async_views import async_read_patterns
 from recipes.views import short_link_redirect
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
-    path('s/<str:short_link_id>/',
-         short_link_redirect, name='short_link-redirect'),
+    *async_read_patterns((
+        path('s/<str:short_link_id>/',
+             short_link_redirect, name='short_link-redirect'),
+    ), ('short_link-redirect',)),
 ]
 
 if settings.DEBUG:
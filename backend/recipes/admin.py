@@ -1,8 +1,88 @@
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Prefetch, Q
+from django.utils.functional import cached_property
 from django.utils.safestring import mark_safe
 
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
                             ShoppingCart, Tag)
+from recipes.search import search_filter
+from recipes.services import get_recipe_amounts, update_shopping_cart_totals
+from recipes.similarity import update_signatures
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Пагинатор для больших таблиц.
+
+    Для выборки без условий на PostgreSQL берет оценку числа строк
+    из статистики планировщика вместо COUNT(*).
+    """
+
+    estimate_threshold = 100000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql' and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples FROM pg_class WHERE relname = %s',
+                    (queryset.model._meta.db_table,)
+                )
+                row = cursor.fetchone()
+            if row and row[0] > self.estimate_threshold:
+                return int(row[0])
+        return super().count
+
+
+class UsernameFilter(admin.SimpleListFilter):
+    """Фильтр по имени пользователя через поле ввода вместо списка."""
+
+    template = 'admin/input_filter.html'
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def has_output(self):
+        return True
+
+    def choices(self, changelist):
+        yield {
+            'query_string': changelist.get_query_string(
+                remove=(self.parameter_name,)
+            ),
+            'params': {
+                key: value for key, value in changelist.params.items()
+                if key not in (self.parameter_name, 'p')
+            },
+        }
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(
+                **{f'{self.parameter_name}__username': self.value()}
+            )
+        return queryset
+
+
+class AuthorFilter(UsernameFilter):
+    title = 'автор'
+    parameter_name = 'author'
+
+
+class UserFilter(UsernameFilter):
+    title = 'пользователь'
+    parameter_name = 'user'
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Базовый интерфейс для таблиц с большим числом строк."""
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 class RecipeNameMixin:
@@ -18,22 +98,51 @@ class RecipeIngredientInline(admin.TabularInline):
 
     model = RecipeIngredient
     fields = ('ingredient', 'amount')
+    autocomplete_fields = ('ingredient',)
     extra = 0
     min_num = 1
     validate_min = True
 
 
 @admin.register(Recipe)
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeAdmin(LargeTableAdmin):
     """Административный интерфейс для управления рецептами."""
 
     list_display = ('id', 'author', 'name', 'get_tags', 'favorites_count',
                     'get_ingredients', 'image_preview', 'cooking_time',
                     'pub_date')
-    search_fields = ('author__username', 'name', 'text')
-    list_filter = ('tags', 'author')
+    search_fields = ('=author__username',)
+    list_filter = ('tags', AuthorFilter)
+    autocomplete_fields = ('author',)
     inlines = (RecipeIngredientInline, )
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'author'
+        ).prefetch_related(
+            'tags',
+            Prefetch(
+                'recipe_ingredients',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            )
+        )
+
+    def get_search_results(self, request, queryset, search_term):
+        """Ищет по имени автора и полнотекстово по названию и описанию."""
+        if not search_term.strip():
+            return queryset, False
+        condition = Q(author__username=search_term)
+        matches = search_filter(search_term)
+        if matches is not None:
+            condition |= Q(matches)
+        return queryset.filter(condition), False
+
+    def save_related(self, request, form, formsets, change):
+        old_amounts = get_recipe_amounts(form.instance.id) if change else {}
+        super().save_related(request, form, formsets, change)
+        update_shopping_cart_totals(form.instance.id, old_amounts)
+        update_signatures([form.instance.id])
+
     @admin.display(description='Изображение')
     def image_preview(self, obj):
         return mark_safe(
@@ -51,17 +160,13 @@ class RecipeAdmin(admin.ModelAdmin):
             for ri in obj.recipe_ingredients.all()
         )
 
-    @admin.display(description='Количество добавлений в избранное')
-    def favorites_count(self, obj):
-        return obj.favorites.count()
-
 
 @admin.register(Ingredient)
 class IngredientAdmin(admin.ModelAdmin):
     """Административный интерфейс для управления ингредиентами."""
 
     list_display = ('id', 'name', 'measurement_unit')
-    list_filter = ('name',)
+    list_filter = ('measurement_unit',)
     search_fields = ('name',)
 
 
@@ -75,18 +180,22 @@ class TagAdmin(admin.ModelAdmin):
 
 
 @admin.register(Favorite)
-class FavoriteAdmin(RecipeNameMixin, admin.ModelAdmin):
+class FavoriteAdmin(RecipeNameMixin, LargeTableAdmin):
     """Административный интерфейс для управления избранным."""
 
     list_display = ('id', 'user', 'display_recipe')
-    list_filter = ('user',)
-    search_fields = ('user__username', 'recipe__name')
+    list_filter = (UserFilter,)
+    list_select_related = ('user', 'recipe')
+    search_fields = ('=user__username', 'recipe__name')
+    autocomplete_fields = ('user', 'recipe')
 
 
 @admin.register(ShoppingCart)
-class ShoppingCartAdmin(RecipeNameMixin, admin.ModelAdmin):
+class ShoppingCartAdmin(RecipeNameMixin, LargeTableAdmin):
     """Административный интерфейс для управления покупками."""
 
     list_display = ('id', 'user', 'display_recipe')
-    list_filter = ('user',)
-    search_fields = ('user__username', 'recipe__name')
+    list_filter = (UserFilter,)
+    list_select_related = ('user', 'recipe')
+    search_fields = ('=user__username', 'recipe__name')
+    autocomplete_fields = ('user', 'recipe')
@@ -7,5 +7,13 @@ class Constants:
     MAX_TAG_NAME_LENGTH = 32
     MAX_INGREDIENT_NAME_LENGTH = 128
     MAX_INGREDIENT_MEASUREMENT_LENGTH = 64
-    RECIPES_COUNT = 0
     MAX_TIME = 1500
+    MAX_RECIPES_LIMIT = 100
+    MAX_PANTRY_SIZE = 100
+    MAX_RECOMMENDATION_SOURCES = 100
+    SIMILAR_RECIPES_COUNT = 20
+    MINHASH_PERMUTATIONS = 64
+    MINHASH_BANDS = 16
+    MAX_SIMILAR_CANDIDATES = 1000
+    NEAR_DUPLICATE_SIMILARITY = 0.9
+    MAX_POPULAR_RECIPES = 100
@@ -0,0 +1,209 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections, transaction
+from django.db.models import Exists, OuterRef, Q
+
+from recipes.loaders import batched
+from recipes.models import FeedEntry, Recipe
+from users.models import Follow
+
+User = get_user_model()
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.FEED_WORKERS, thread_name_prefix='feed'
+        )
+    return _executor
+
+
+def run_task(function, *args):
+    close_old_connections()
+    try:
+        function(*args)
+    except Exception:
+        logger.exception('Ошибка обновления ленты: %s%s', function, args)
+    finally:
+        close_old_connections()
+
+
+def schedule(function, *args):
+    """Выполняет обновление ленты в пуле потоков после фиксации транзакции."""
+    if not settings.FEED_WORKERS:
+        transaction.on_commit(partial(run_task, function, *args))
+        return
+    transaction.on_commit(partial(
+        get_executor().submit, run_task, function, *args
+    ))
+
+
+def pull_authors(prefix=''):
+    """
+    Условие для авторов, рецепты которых лента читает напрямую.
+
+    Рассылка рецептов таким авторам обходится дороже всего: у них
+    слишком много подписчиков или рецептов.
+    """
+    return Q(**{
+        f'{prefix}followers_count__gte': settings.FEED_PULL_FOLLOWERS
+    }) | Q(**{
+        f'{prefix}recipes_count__gte': settings.FEED_PULL_RECIPES
+    })
+
+
+def is_pull_author(author_id):
+    return User.objects.filter(pull_authors(), pk=author_id).exists()
+
+
+def schedule_author_backfill(author_id, counter):
+    """
+    Заполняет ленты подписчиков автора, переставшего читаться напрямую.
+
+    Вызывается в транзакции сразу после уменьшения счетчика counter
+    автора: рецепты, опубликованные, пока лента читала их напрямую,
+    подписчикам не рассылались.
+    """
+    threshold = {
+        'followers_count': settings.FEED_PULL_FOLLOWERS,
+        'recipes_count': settings.FEED_PULL_RECIPES,
+    }[counter]
+    if User.objects.filter(
+        pk=author_id, **{counter: threshold - 1}
+    ).exclude(pull_authors()).exists():
+        schedule(backfill_author, author_id)
+
+
+def fan_out_recipe(recipe_id):
+    """Добавляет рецепт в ленты подписчиков автора."""
+    recipe = Recipe.objects.filter(pk=recipe_id).values(
+        'author_id', 'pub_date'
+    ).first()
+    if recipe is None or is_pull_author(recipe['author_id']):
+        return
+    followers = Follow.objects.filter(
+        author_id=recipe['author_id']
+    ).values_list('user_id', flat=True)
+    for user_ids in batched(
+        followers.iterator(), settings.FEED_FANOUT_BATCH_SIZE
+    ):
+        FeedEntry.objects.bulk_create([
+            FeedEntry(user_id=user_id, recipe_id=recipe_id, **recipe)
+            for user_id in user_ids
+        ], ignore_conflicts=True)
+
+
+def backfill_follow(user_id, author_id):
+    """Добавляет в ленту последние рецепты нового автора подписки."""
+    if is_pull_author(author_id) or not Follow.objects.filter(
+        user_id=user_id, author_id=author_id
+    ).exists():
+        return
+    FeedEntry.objects.bulk_create([
+        FeedEntry(
+            user_id=user_id,
+            recipe_id=recipe_id,
+            author_id=author_id,
+            pub_date=pub_date
+        )
+        for recipe_id, pub_date in Recipe.objects.filter(
+            author_id=author_id
+        ).order_by('-pub_date', '-id').values_list(
+            'id', 'pub_date'
+        )[:settings.FEED_BACKFILL_SIZE]
+    ], ignore_conflicts=True)
+
+
+def backfill_author(author_id):
+    """
+    Добавляет подписчикам рецепты автора, не попавшие в их ленты.
+
+    Это рецепты новее последнего разосланного, а если рассылок не было,
+    последние рецепты автора, как при новой подписке.
+    """
+    if is_pull_author(author_id):
+        return
+    recipes = Recipe.objects.filter(author_id=author_id)
+    last_pushed = recipes.filter(Exists(FeedEntry.objects.filter(
+        recipe=OuterRef('pk')
+    ))).order_by('-pub_date').values_list('pub_date', flat=True).first()
+    recipes = recipes.order_by('-pub_date', '-id').values_list(
+        'id', 'pub_date'
+    )
+    recipes = list(
+        recipes[:settings.FEED_BACKFILL_SIZE] if last_pushed is None
+        else recipes.filter(pub_date__gt=last_pushed)
+    )
+    if not recipes:
+        return
+    followers = Follow.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True)
+    for user_ids in batched(
+        followers.iterator(),
+        max(1, settings.FEED_FANOUT_BATCH_SIZE // len(recipes))
+    ):
+        FeedEntry.objects.bulk_create([
+            FeedEntry(
+                user_id=user_id,
+                recipe_id=recipe_id,
+                author_id=author_id,
+                pub_date=pub_date
+            )
+            for user_id in user_ids
+            for recipe_id, pub_date in recipes
+        ], ignore_conflicts=True)
+
+
+def prune_follow(user_id, author_id):
+    """Удаляет из ленты рецепты автора, если подписка не возобновлена."""
+    if Follow.objects.filter(user_id=user_id, author_id=author_id).exists():
+        return
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def before(position, pk_field):
+    """Условие для строк ленты после позиции (дата публикации, id)."""
+    pub_date, pk = position
+    return Q(pub_date__lt=pub_date) | Q(
+        pub_date=pub_date, **{f'{pk_field}__lt': pk}
+    )
+
+
+def feed_sources(user):
+    """
+    Источники ленты пользователя для слияния при чтении.
+
+    Каждый источник по позиции и лимиту возвращает
+    [(дата публикации, id рецепта), ...] по убыванию. Записи
+    отписанных авторов скрываются до их удаления в фоне.
+    """
+    def timeline(position, limit):
+        queryset = FeedEntry.objects.filter(Exists(Follow.objects.filter(
+            user=user, author=OuterRef('author')
+        )), user=user)
+        if position is not None:
+            queryset = queryset.filter(before(position, 'recipe_id'))
+        return list(queryset.order_by('-pub_date', '-recipe_id').values_list(
+            'pub_date', 'recipe_id'
+        )[:limit])
+
+    def pulled(position, limit):
+        queryset = Recipe.objects.filter(author__in=Follow.objects.filter(
+            pull_authors('author__'), user=user
+        ).values('author'))
+        if position is not None:
+            queryset = queryset.filter(before(position, 'id'))
+        return list(queryset.order_by('-pub_date', '-id').values_list(
+            'pub_date', 'id'
+        )[:limit])
+
+    return timeline, pulled
@@ -0,0 +1,258 @@
+import csv
+import io
+import json
+import os
+import re
+import time
+from collections import Counter
+from itertools import islice
+
+from django.db import connection
+
+CHUNK_SIZE = 64 * 1024
+SOURCE_FORMATS = ('jsonl', 'json', 'csv')
+JSON_SEPARATORS = re.compile(r'[\s,]*')
+
+
+def batched(iterable, size):
+    """Разбивает поток на списки длиной не больше size."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def find_source(directory, name):
+    """Возвращает путь первого найденного файла name.jsonl/json/csv."""
+    for file_format in SOURCE_FORMATS:
+        path = os.path.join(directory, f'{name}.{file_format}')
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def iter_json(file):
+    """
+    Читает объекты из JSON-массива или JSON Lines по частям.
+
+    В памяти держится только текущий фрагмент файла, а не весь документ.
+    """
+    decoder = json.JSONDecoder()
+    buffer = file.read(CHUNK_SIZE).lstrip()
+    in_array = buffer.startswith('[')
+    position = int(in_array)
+    while True:
+        position = JSON_SEPARATORS.match(buffer, position).end()
+        if position < len(buffer):
+            if in_array and buffer[position] == ']':
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                pass
+            else:
+                yield item
+                continue
+        chunk = file.read(CHUNK_SIZE)
+        if not chunk:
+            if position < len(buffer):
+                decoder.raw_decode(buffer, position)
+            return
+        buffer = buffer[position:] + chunk
+        position = 0
+
+
+def iter_csv(file, fields):
+    """
+    Читает строки CSV как словари.
+
+    Если первая строка содержит названия полей, она считается заголовком,
+    иначе колонки сопоставляются с fields по порядку.
+    """
+    reader = csv.reader(file)
+    first = next(reader, None)
+    if first is None:
+        return
+    if set(fields) <= set(first):
+        columns = first
+    else:
+        columns = fields
+        yield dict(zip(columns, first))
+    for row in reader:
+        yield dict(zip(columns, row))
+
+
+def iter_source(path, fields):
+    with open(path, encoding='utf-8', newline='') as file:
+        if path.endswith('.csv'):
+            yield from iter_csv(file, fields)
+        else:
+            yield from iter_json(file)
+
+
+class Throughput:
+    """Счетчик обработанных строк и скорости загрузки."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.rows = 0
+
+    def add(self, rows):
+        self.rows += rows
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def __str__(self):
+        elapsed = self.elapsed
+        return (
+            f'{self.rows} строк за {elapsed:.2f} с '
+            f'({self.rows / elapsed if elapsed else 0:.0f} строк/с)'
+        )
+
+
+def upsert_fields(model, unique_fields):
+    """Поля модели для загрузки и поля, которые обновляются при конфликте."""
+    fields = tuple(
+        field.name for field in model._meta.concrete_fields
+        if not field.primary_key
+    )
+    return fields, tuple(
+        field for field in fields if field not in unique_fields
+    )
+
+
+def deduplicate(rows, unique_fields):
+    """Оставляет последнюю строку для каждого значения ключа."""
+    return {
+        tuple(row[field] for field in unique_fields): row for row in rows
+    }
+
+
+def match_unique(model, rows, unique_fields, match_fields):
+    """
+    Согласует строки с записями, совпадающими по другим уникальным полям.
+
+    Запись с тем же значением поля из match_fields, но другим ключом
+    получает ключ строки, и загрузка обновляет ее. Строки, совпадающие
+    с разными записями или друг с другом по разным полям, пропускаются.
+    Возвращает строки для загрузки, число пропущенных строк и число
+    записей, получивших новый ключ.
+    """
+    if not match_fields:
+        return rows, 0, 0
+    key, = unique_fields
+    rows = list(deduplicate(rows, unique_fields).values())
+    counts = {
+        field: Counter(row[field] for row in rows) for field in match_fields
+    }
+    existing = {
+        field: dict(model.objects.filter(**{
+            f'{field}__in': {row[field] for row in rows}
+        }).values_list(field, 'pk'))
+        for field in (key, *match_fields)
+    }
+    matched, renamed = [], {}
+    for row in rows:
+        if any(counts[field][row[field]] > 1 for field in match_fields):
+            continue
+        pks = {
+            existing[field].get(row[field]) for field in (key, *match_fields)
+        } - {None}
+        if len(pks) > 1:
+            continue
+        if pks and row[key] not in existing[key]:
+            renamed[pks.pop()] = row[key]
+        matched.append(row)
+    model.objects.bulk_update(
+        [model(pk=pk, **{key: value}) for pk, value in renamed.items()],
+        (key,)
+    )
+    return matched, len(rows) - len(matched), len(renamed)
+
+
+def copy_upsert(model, rows, unique_fields):
+    """
+    Загружает строки через COPY во временную таблицу и переносит их
+    в таблицу модели одним INSERT ... ON CONFLICT.
+
+    Только для PostgreSQL. Возвращает число вставленных и обновленных строк.
+    """
+    fields, update_fields = upsert_fields(model, unique_fields)
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    staging = quote(f'staging_{model._meta.db_table}')
+    columns = ', '.join(quote(field) for field in fields)
+    keys = ', '.join(quote(field) for field in unique_fields)
+    if update_fields:
+        conflict = 'DO UPDATE SET {} WHERE {}'.format(
+            ', '.join(
+                f'{quote(field)} = EXCLUDED.{quote(field)}'
+                for field in update_fields
+            ),
+            ' OR '.join(
+                f'{table}.{quote(field)} IS DISTINCT FROM '
+                f'EXCLUDED.{quote(field)}'
+                for field in update_fields
+            )
+        )
+    else:
+        conflict = 'DO NOTHING'
+    data = io.StringIO()
+    writer = csv.writer(data)
+    for row in rows:
+        writer.writerow(row[field] for field in fields)
+    data.seek(0)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TEMPORARY TABLE IF NOT EXISTS {staging} '
+            f'AS SELECT {columns} FROM {table} WITH NO DATA'
+        )
+        cursor.execute(f'TRUNCATE {staging}')
+        cursor.copy_expert(
+            f'COPY {staging} ({columns}) FROM STDIN WITH (FORMAT csv)', data
+        )
+        cursor.execute(
+            f'INSERT INTO {table} ({columns}) '
+            f'SELECT DISTINCT ON ({keys}) {columns} FROM {staging} '
+            f'ON CONFLICT ({keys}) {conflict}'
+        )
+        return cursor.rowcount
+
+
+def orm_upsert(model, rows, unique_fields):
+    """
+    Вставляет новые строки и обновляет изменившиеся средствами ORM.
+
+    Запасной вариант для баз без COPY. Возвращает число записанных строк.
+    """
+    fields, update_fields = upsert_fields(model, unique_fields)
+    rows = deduplicate(rows, unique_fields)
+    existing = {
+        tuple(getattr(obj, field) for field in unique_fields): obj
+        for obj in model.objects.filter(**{
+            f'{unique_fields[0]}__in': {key[0] for key in rows}
+        }).only(*fields)
+    }
+    to_create, to_update = [], []
+    for key, row in rows.items():
+        obj = existing.get(key)
+        if obj is None:
+            to_create.append(model(**row))
+        elif any(getattr(obj, field) != row[field] for field in update_fields):
+            for field in update_fields:
+                setattr(obj, field, row[field])
+            to_update.append(obj)
+    model.objects.bulk_create(to_create, ignore_conflicts=True)
+    if update_fields:
+        model.objects.bulk_update(to_update, update_fields)
+    return len(to_create) + len(to_update)
+
+
+def upsert(model, rows, unique_fields):
+    if connection.vendor == 'postgresql':
+        return copy_upsert(model, rows, unique_fields)
+    return orm_upsert(model, rows, unique_fields)
@@ -0,0 +1,209 @@
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+from django.core.management import BaseCommand, CommandError
+
+SERVERS = {
+    'wsgi': ('foodgram.wsgi',),
+    'asgi': ('foodgram.asgi', '-k', 'uvicorn.workers.UvicornWorker'),
+}
+
+
+def percentile(values, share):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+async def fetch(host, port, path):
+    """Выполняет GET-запрос и возвращает код ответа."""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(
+            f'GET {path} HTTP/1.1\r\nHost: {host}\r\n'
+            f'Connection: close\r\n\r\n'.encode()
+        )
+        await writer.drain()
+        status = await reader.readline()
+        await reader.read()
+        return int(status.split()[1])
+    finally:
+        writer.close()
+
+
+async def slow_client(host, port, path, interval, stop):
+    """
+    Медленный клиент: передает заголовки запроса по байту.
+
+    Соединение остается занятым, пока не установлено событие stop,
+    а после этого запрос завершается и ответ дочитывается.
+    """
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+    except OSError:
+        return
+    try:
+        writer.write(f'GET {path} HTTP/1.1\r\nHost: {host}\r\n'.encode())
+        while not stop.is_set():
+            for byte in b'X-Slow: 1\r\n':
+                writer.write(bytes((byte,)))
+                await writer.drain()
+                try:
+                    await asyncio.wait_for(stop.wait(), interval)
+                except asyncio.TimeoutError:
+                    continue
+                break
+        writer.write(b'Connection: close\r\n\r\n')
+        await writer.drain()
+        await reader.read()
+    except OSError:
+        pass
+    finally:
+        writer.close()
+
+
+async def fast_client(host, port, paths, deadline, latencies, errors):
+    """Отправляет запросы подряд до deadline, записывая задержки."""
+    number = 0
+    while time.monotonic() < deadline:
+        path = paths[number % len(paths)]
+        number += 1
+        started = time.monotonic()
+        try:
+            status = await asyncio.wait_for(
+                fetch(host, port, path), deadline - started + 1
+            )
+        except (OSError, asyncio.TimeoutError, IndexError, ValueError):
+            errors.append(path)
+            continue
+        if status != 200:
+            errors.append(path)
+            continue
+        latencies.append(time.monotonic() - started)
+
+
+async def run_load(host, port, options):
+    stop = asyncio.Event()
+    slow = [
+        asyncio.ensure_future(slow_client(
+            host, port, options['path'][0], options['slow_interval'], stop
+        ))
+        for _ in range(options['slow_clients'])
+    ]
+    await asyncio.sleep(options['slow_interval'])
+    latencies, errors = [], []
+    started = time.monotonic()
+    deadline = started + options['duration']
+    await asyncio.gather(*(
+        fast_client(host, port, options['path'], deadline, latencies, errors)
+        for _ in range(options['connections'])
+    ))
+    elapsed = time.monotonic() - started
+    stop.set()
+    if slow:
+        await asyncio.wait(slow, timeout=5)
+    return latencies, errors, elapsed
+
+
+async def wait_ready(host, port, path, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if await fetch(host, port, path) == 200:
+                return True
+        except (OSError, IndexError, ValueError):
+            pass
+        await asyncio.sleep(0.2)
+    return False
+
+
+class Command(BaseCommand):
+    """
+    Сравнивает пропускную способность режимов WSGI и ASGI.
+
+    Для каждого режима запускается gunicorn с одинаковым числом
+    воркеров: синхронными (foodgram.wsgi) или uvicorn (foodgram.asgi).
+    Медленные клиенты держат соединения, передавая заголовки по байту,
+    а быстрые клиенты параллельно выполняют GET-запросы; выводятся
+    запросы в секунду, медиана и 99-й перцентиль задержки.
+    """
+
+    help = 'Сравнивает пропускную способность gunicorn в режимах WSGI и ASGI.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--mode',
+            action='append',
+            choices=SERVERS,
+            help='Режим сервера, по умолчанию оба.'
+        )
+        parser.add_argument(
+            '--path',
+            action='append',
+            help='Адрес запроса, по умолчанию /api/recipes/ и /api/tags/.'
+        )
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=2,
+            help='Количество воркеров gunicorn.'
+        )
+        parser.add_argument(
+            '--connections',
+            type=int,
+            default=20,
+            help='Количество параллельных быстрых клиентов.'
+        )
+        parser.add_argument(
+            '--slow-clients',
+            type=int,
+            default=10,
+            help='Количество медленных клиентов.'
+        )
+        parser.add_argument(
+            '--slow-interval',
+            type=float,
+            default=0.5,
+            help='Пауза между байтами медленного клиента, с.'
+        )
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=10,
+            help='Длительность замера для каждого режима, с.'
+        )
+
+    def handle(self, *args, **options):
+        options['path'] = options['path'] or ['/api/recipes/', '/api/tags/']
+        host, port = options['host'], options['port']
+        for mode in options['mode'] or SERVERS:
+            server = subprocess.Popen(
+                (sys.executable, '-m', 'gunicorn', *SERVERS[mode],
+                 '--bind', f'{host}:{port}',
+                 '--workers', str(options['workers']),
+                 '--log-level', 'warning'),
+                env={**os.environ, 'ASYNC_READ_VIEWS': str(mode == 'asgi')}
+            )
+            try:
+                if not asyncio.run(
+                    wait_ready(host, port, options['path'][0], 30)
+                ):
+                    raise CommandError(f'Сервер {mode} не запустился.')
+                latencies, errors, elapsed = asyncio.run(
+                    run_load(host, port, options)
+                )
+            finally:
+                server.terminate()
+                server.wait()
+            self.stdout.write(
+                f'{mode}: {len(latencies) / elapsed:.1f} запросов/с, '
+                f'p50 {percentile(latencies, 0.5) * 1000:.1f} мс, '
+                f'p99 {percentile(latencies, 0.99) * 1000:.1f} мс, '
+                f'ошибок {len(errors)}'
+            )
@@ -0,0 +1,75 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from recipes.loaders import Throughput, batched
+from recipes.models import SimilarRecipe
+from recipes.services import recipe_exists
+from recipes.similarity import iter_neighbours, load_interactions
+
+
+class Command(BaseCommand):
+    """
+    Пересчитывает таблицу похожих рецептов.
+
+    Сходство рецептов - косинусная мера по пользователям, добавившим
+    их в избранное или в список покупок. Таблица заменяется целиком
+    в одной транзакции, читатели до ее завершения видят старые данные.
+    """
+
+    help = 'Строит таблицу похожих рецептов по избранному и спискам покупок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top-k',
+            type=int,
+            default=20,
+            help='Количество похожих рецептов для каждого рецепта.'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Количество рецептов в одной пачке записи.'
+        )
+        parser.add_argument(
+            '--max-user-items',
+            type=int,
+            default=500,
+            help='Пропускать пользователей с большим числом рецептов.'
+        )
+
+    def handle(self, *args, **options):
+        throughput = Throughput()
+        user_items, recipe_users, norms = load_interactions(
+            options['max_user_items']
+        )
+        self.stdout.write(
+            f'Загружено {sum(norms.values())} взаимодействий '
+            f'{len(user_items)} пользователей за {throughput.elapsed:.2f} с'
+        )
+        throughput = Throughput()
+        written = 0
+        with transaction.atomic():
+            SimilarRecipe.objects.all().delete()
+            for batch in batched(
+                iter_neighbours(
+                    user_items, recipe_users, norms, options['top_k']
+                ),
+                options['chunk_size']
+            ):
+                written += self.save_batch(batch)
+                throughput.add(len(batch))
+                if options['verbosity'] > 1:
+                    self.stdout.write(f'Обработано {throughput}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Похожие рецепты построены: {throughput}, записано {written}'
+        ))
+
+    def save_batch(self, batch):
+        """Записывает пачку, пропуская рецепты, удаленные во время расчета."""
+        return len(SimilarRecipe.objects.bulk_create([
+            SimilarRecipe(recipe_id=recipe_id, similar_id=similar_id,
+                          score=score)
+            for recipe_id, neighbours in batch if recipe_exists(recipe_id)
+            for score, similar_id in neighbours if recipe_exists(similar_id)
+        ]))
@@ -0,0 +1,18 @@
+from django.core.management import BaseCommand
+
+from recipes.popularity import compact_popularity
+
+
+class Command(BaseCommand):
+    """Переносит эпоху рейтинга популярности на текущий момент."""
+
+    help = (
+        'Пересчитывает рейтинги популярности к текущему моменту '
+        'и удаляет затухшие.'
+    )
+
+    def handle(self, *args, **options):
+        rescaled, deleted = compact_popularity()
+        self.stdout.write(self.style.SUCCESS(
+            f'Рейтинги пересчитаны: {rescaled}, удалено затухших {deleted}'
+        ))
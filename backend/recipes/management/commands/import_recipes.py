@@ -0,0 +1,313 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files import File
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from recipes.constants import Constants
+from recipes.loaders import Throughput, batched
+from recipes.minhash import ingredients_signature
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from recipes.services import (bump_recipe_ids_version, count_subquery,
+                              log_recipe_ingredients)
+from recipes.similarity import index_signatures
+
+User = get_user_model()
+
+
+def ingredient_key(name, measurement_unit):
+    return name.strip().lower(), measurement_unit.strip()
+
+
+def parse_pub_date(value):
+    pub_date = parse_datetime(value or '')
+    if pub_date is not None and timezone.is_naive(pub_date):
+        pub_date = timezone.make_aware(pub_date)
+    return pub_date
+
+
+def iter_records(path, offset):
+    """Читает JSONL с offset, возвращая (смещение после строки, запись)."""
+    with open(path, 'rb') as file:
+        file.seek(offset)
+        while True:
+            line = file.readline()
+            if not line:
+                return
+            if line.strip():
+                yield file.tell(), json.loads(line)
+
+
+class Command(BaseCommand):
+    """
+    Импорт рецептов из JSONL.
+
+    Каждая строка - рецепт с автором, тегами (slug или название),
+    ингредиентами (название, единица измерения, количество) и путем
+    к изображению. Рецепты пишутся пачками, каждая в своей транзакции,
+    после которой сохраняется позиция в файле для продолжения импорта.
+    """
+
+    help = 'Импортирует рецепты из файла JSON Lines.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл JSON Lines с рецептами.')
+        parser.add_argument(
+            '--images',
+            default='',
+            help='Каталог, относительно которого указаны пути изображений.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество рецептов в одной транзакции.'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=8,
+            help='Количество потоков копирования изображений.'
+        )
+        parser.add_argument(
+            '--create-authors',
+            action='store_true',
+            help='Создавать отсутствующих авторов, если указан email.'
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Начать с начала файла, не учитывая сохраненную позицию.'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'Файл {path} не найден.')
+        self.options = options
+        self.checkpoint_path = f'{path}.checkpoint'
+        state = {'offset': 0, 'imported': 0, 'skipped': 0}
+        if os.path.exists(self.checkpoint_path) and not options['restart']:
+            with open(self.checkpoint_path) as file:
+                state = json.load(file)
+            self.stdout.write(
+                f'Продолжение импорта с позиции {state["offset"]}'
+            )
+        self.tags = {}
+        for pk, name, slug in Tag.objects.values_list('id', 'name', 'slug'):
+            self.tags[name] = self.tags[slug] = pk
+        self.ingredients = {
+            ingredient_key(name, measurement_unit): pk
+            for pk, name, measurement_unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit'
+            )
+        }
+        self.authors = {}
+        throughput = Throughput()
+        with ThreadPoolExecutor(options['workers']) as self.executor:
+            for batch in batched(
+                iter_records(path, state['offset']), options['batch_size']
+            ):
+                imported = self.import_batch(
+                    [record for _, record in batch]
+                )
+                state['offset'] = batch[-1][0]
+                state['imported'] += imported
+                state['skipped'] += len(batch) - imported
+                self.save_state(state)
+                throughput.add(len(batch))
+                if options['verbosity'] > 1:
+                    self.stdout.write(f'Обработано {throughput}')
+        if os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+        self.stdout.write(self.style.SUCCESS(
+            f'Импорт завершен: {throughput}, всего импортировано '
+            f'{state["imported"]}, пропущено {state["skipped"]}'
+        ))
+
+    def save_state(self, state):
+        temporary_path = f'{self.checkpoint_path}.tmp'
+        with open(temporary_path, 'w') as file:
+            json.dump(state, file)
+        os.replace(temporary_path, self.checkpoint_path)
+
+    def skip(self, record, reason):
+        if self.options['verbosity'] > 1:
+            self.stderr.write(
+                f'Пропущен рецепт "{record.get("name")}": {reason}'
+            )
+
+    def resolve_authors(self, records):
+        """Дополняет карту авторов одним запросом на пачку."""
+        authors = {}
+        for record in records:
+            author = record.get('author')
+            if not isinstance(author, dict):
+                author = {'username': author}
+            if author['username'] not in self.authors:
+                authors[author['username']] = author
+        if not authors:
+            return
+        self.authors.update(User.objects.filter(
+            username__in=authors
+        ).values_list('username', 'id'))
+        missing = [
+            author for username, author in authors.items()
+            if username not in self.authors and author.get('email')
+        ]
+        if missing and self.options['create_authors']:
+            User.objects.bulk_create([
+                User(
+                    username=author['username'],
+                    email=author['email'],
+                    first_name=author.get('first_name', ''),
+                    last_name=author.get('last_name', ''),
+                    password=make_password(None)
+                ) for author in missing
+            ], ignore_conflicts=True)
+            self.authors.update(User.objects.filter(
+                username__in=[author['username'] for author in missing]
+            ).values_list('username', 'id'))
+
+    def parse(self, record):
+        """Проверяет запись и переводит названия в id. None - пропустить."""
+        author = record.get('author')
+        if isinstance(author, dict):
+            author = author.get('username')
+        author_id = self.authors.get(author)
+        if author_id is None:
+            return self.skip(record, f'автор {author} не найден')
+        name = str(record.get('name') or '').strip()
+        text = str(record.get('text') or '').strip()
+        if not name or len(name) > Constants.MAX_NAME_LENGTH or not text:
+            return self.skip(record, 'неверное название или описание')
+        try:
+            cooking_time = int(record.get('cooking_time'))
+        except (TypeError, ValueError):
+            cooking_time = 0
+        if not Constants.MIN_TIME <= cooking_time <= Constants.MAX_TIME:
+            return self.skip(record, 'неверное время приготовления')
+        tag_ids = {self.tags.get(tag) for tag in record.get('tags') or ()}
+        if not tag_ids or None in tag_ids:
+            return self.skip(record, 'неизвестные теги')
+        amounts = {}
+        for item in record.get('ingredients') or ():
+            pk = self.ingredients.get(ingredient_key(
+                str(item.get('name', '')),
+                str(item.get('measurement_unit', ''))
+            ))
+            if pk is None:
+                return self.skip(record, f'неизвестный ингредиент {item}')
+            try:
+                amount = int(item.get('amount'))
+            except (TypeError, ValueError):
+                amount = 0
+            if amount < Constants.MIN_AMOUNT:
+                return self.skip(record, f'неверное количество {item}')
+            amounts[pk] = amounts.get(pk, 0) + amount
+        if not amounts:
+            return self.skip(record, 'нет ингредиентов')
+        image = os.path.join(self.options['images'], record.get('image', ''))
+        if not os.path.isfile(image):
+            return self.skip(record, f'нет изображения {image}')
+        return {
+            'recipe': Recipe(
+                author_id=author_id,
+                name=name,
+                text=text,
+                cooking_time=cooking_time,
+                ingredients_signature=ingredients_signature(amounts)
+            ),
+            'pub_date': parse_pub_date(record.get('pub_date')),
+            'tags': tag_ids,
+            'ingredients': amounts,
+            'image': image,
+        }
+
+    def copy_image(self, item):
+        recipe = item['recipe']
+        field = Recipe._meta.get_field('image')
+        with open(item['image'], 'rb') as file:
+            recipe.image = field.storage.save(
+                field.generate_filename(
+                    recipe, os.path.basename(item['image'])
+                ),
+                File(file)
+            )
+        return recipe.image.name
+
+    def import_batch(self, records):
+        self.resolve_authors(records)
+        items = {}
+        for record in records:
+            item = self.parse(record)
+            if item is not None:
+                recipe = item['recipe']
+                items.setdefault((recipe.author_id, recipe.name), item)
+        existing = set(Recipe.objects.filter(
+            author_id__in={key[0] for key in items},
+            name__in={key[1] for key in items}
+        ).values_list('author_id', 'name'))
+        items = [item for key, item in items.items() if key not in existing]
+        if not items:
+            return 0
+        images = list(self.executor.map(self.copy_image, items))
+        try:
+            self.save_batch(items)
+        except Exception:
+            storage = Recipe._meta.get_field('image').storage
+            for name in images:
+                storage.delete(name)
+            raise
+        return len(items)
+
+    @transaction.atomic
+    def save_batch(self, items):
+        recipes = Recipe.objects.bulk_create(
+            [item['recipe'] for item in items]
+        )
+        if recipes and recipes[0].pk is None:
+            ids = {
+                (author_id, name): pk
+                for pk, author_id, name in Recipe.objects.filter(
+                    author_id__in={recipe.author_id for recipe in recipes},
+                    name__in={recipe.name for recipe in recipes}
+                ).values_list('id', 'author_id', 'name')
+            }
+            for recipe in recipes:
+                recipe.pk = ids[recipe.author_id, recipe.name]
+        dated = []
+        for item in items:
+            if item['pub_date'] is not None:
+                item['recipe'].pub_date = item['pub_date']
+                dated.append(item['recipe'])
+        Recipe.objects.bulk_update(dated, ('pub_date',))
+        Recipe.tags.through.objects.bulk_create([
+            Recipe.tags.through(recipe_id=item['recipe'].pk, tag_id=tag_id)
+            for item in items for tag_id in item['tags']
+        ])
+        recipe_ingredients = RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(
+                recipe_id=item['recipe'].pk,
+                ingredient_id=ingredient_id,
+                amount=amount
+            )
+            for item in items
+            for ingredient_id, amount in item['ingredients'].items()
+        ])
+        log_recipe_ingredients(
+            (row.recipe_id, row.ingredient_id) for row in recipe_ingredients
+        )
+        index_signatures({
+            recipe.pk: recipe.ingredients_signature for recipe in recipes
+        }, replace=False)
+        User.objects.filter(
+            pk__in={item['recipe'].author_id for item in items}
+        ).update(recipes_count=count_subquery(Recipe.objects.all(), 'author'))
+        bump_recipe_ids_version()
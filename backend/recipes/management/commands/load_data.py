@@ -1,34 +1,97 @@
-import json
-import os
-
 from django.conf import settings
 from django.core.management import BaseCommand
+from django.db import transaction
+
+from api.cache import bump_generation, bump_version
+from api.indexes import INGREDIENT_INDEX_KEY
+from recipes.loaders import (Throughput, batched, find_source, iter_source,
+                             match_unique, upsert, upsert_fields)
 from recipes.models import Ingredient, Tag
 
 MODEL_MAP = {
-    'tags': Tag,
-    'ingredients': Ingredient,
+    'tags': (Tag, ('slug',), ('name',)),
+    'ingredients': (Ingredient, ('name', 'measurement_unit'), ()),
 }
 
 
+def clean_row(model, fields, row):
+    """Возвращает строку только с полями модели или None, если она неверна."""
+    values = {}
+    for field in fields:
+        value = str(row.get(field) or '').strip()
+        if not value or len(value) > model._meta.get_field(field).max_length:
+            return None
+        values[field] = value
+    return values
+
+
 class Command(BaseCommand):
-    """Класс загрузки тестовой базы данных."""
+    """
+    Класс загрузки справочников тегов и ингредиентов.
+
+    Файлы читаются потоком и записываются пачками с обновлением
+    существующих записей по уникальному ключу. Сигналы моделей при этом
+    не отправляются, поэтому кэши сбрасываются после загрузки.
+    """
+
+    help = 'Загружает теги и ингредиенты из файлов JSON, JSON Lines или CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            default=settings.JSON_FILES_DIR,
+            help='Каталог с файлами tags и ingredients.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10000,
+            help='Количество строк в одной пачке.'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Прочитать и записать данные, откатив транзакцию.'
+        )
 
     def handle(self, *args, **options):
-        for file_name, model in MODEL_MAP.items():
-            path = os.path.join(settings.JSON_FILES_DIR, f'{file_name}.json')
-            if not os.path.exists(path):
+        for file_name, model_options in MODEL_MAP.items():
+            model, unique_fields, match_fields = model_options
+            path = find_source(options['path'], file_name)
+            if path is None:
                 self.stdout.write(self.style.WARNING(
-                    f'Файл {file_name}.json не найден.'
+                    f'Файл {file_name} не найден.'
                 ))
-                return
-            self.stdout.write(f'Началась загрузка файла: {file_name}.json')
-            objects = []
-            with open(path, encoding='utf-8') as f:
-                data = json.load(f)
-                for row in data:
-                    objects.append(model(**row))
-            model.objects.bulk_create(objects, ignore_conflicts=True)
-            self.stdout.write(self.style.SUCCESS(
-                f'Загрузка {file_name}.json завершена'
-            ))
+                continue
+            self.stdout.write(f'Началась загрузка файла: {path}')
+            with transaction.atomic():
+                self.load(path, model, unique_fields, match_fields, options)
+                if options['dry_run']:
+                    transaction.set_rollback(True)
+                else:
+                    bump_version(INGREDIENT_INDEX_KEY)
+                    bump_generation()
+
+    def load(self, path, model, unique_fields, match_fields, options):
+        fields, _ = upsert_fields(model, unique_fields)
+        throughput = Throughput()
+        written = skipped = 0
+        for batch in batched(
+            iter_source(path, fields), options['batch_size']
+        ):
+            rows = [clean_row(model, fields, row) for row in batch]
+            valid = [row for row in rows if row is not None]
+            skipped += len(rows) - len(valid)
+            valid, conflicts, renamed = match_unique(
+                model, valid, unique_fields, match_fields
+            )
+            skipped += conflicts
+            written += renamed + upsert(model, valid, unique_fields)
+            throughput.add(len(rows))
+            if options['verbosity'] > 1:
+                self.stdout.write(f'Прочитано {throughput}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Загрузка {path} завершена: {throughput}, '
+            f'записано {written}, пропущено {skipped}'
+            + (' (пробный запуск)' if options['dry_run'] else '')
+        ))
@@ -0,0 +1,62 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from recipes.models import ShoppingCartIngredient
+from recipes.services import (bump_shopping_cart_versions,
+                              calculate_shopping_cart_totals)
+
+
+class Command(BaseCommand):
+    """Пересчитывает итоги списков покупок и сообщает о расхождениях."""
+
+    help = 'Пересчитывает итоги списков покупок по корзинам пользователей.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать расхождения, не исправляя их.'
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            expected = calculate_shopping_cart_totals()
+            actual = {
+                (row.user_id, row.ingredient_id): row
+                for row in ShoppingCartIngredient.objects.select_for_update()
+            }
+            missing = expected.keys() - actual.keys()
+            extra = actual.keys() - expected.keys()
+            changed = [
+                actual[key] for key in expected.keys() & actual.keys()
+                if actual[key].total_amount != expected[key]
+            ]
+            self.stdout.write(
+                f'Отсутствует строк: {len(missing)}, '
+                f'лишних строк: {len(extra)}, '
+                f'неверных количеств: {len(changed)}'
+            )
+            if options['dry_run'] or not (missing or extra or changed):
+                return
+            ShoppingCartIngredient.objects.bulk_create([
+                ShoppingCartIngredient(
+                    user_id=user_id,
+                    ingredient_id=ingredient_id,
+                    total_amount=expected[user_id, ingredient_id]
+                ) for user_id, ingredient_id in missing
+            ], batch_size=1000)
+            ShoppingCartIngredient.objects.filter(
+                pk__in=[actual[key].pk for key in extra]
+            ).delete()
+            for row in changed:
+                row.total_amount = expected[row.user_id, row.ingredient_id]
+            ShoppingCartIngredient.objects.bulk_update(
+                changed, ('total_amount',), batch_size=1000
+            )
+            bump_shopping_cart_versions(
+                {user_id for user_id, _ in missing | extra}
+                | {row.user_id for row in changed}
+            )
+        self.stdout.write(self.style.SUCCESS(
+            'Итоги списков покупок исправлены'
+        ))
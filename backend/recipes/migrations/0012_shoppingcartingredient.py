@@ -0,0 +1,62 @@
+# Generated by Django 3.2.16 on 2026-10-17 10:05
+
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_totals(apps, schema_editor):
+    ShoppingCart = apps.get_model('recipes', 'ShoppingCart')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    ShoppingCartIngredient = apps.get_model(
+        'recipes', 'ShoppingCartIngredient'
+    )
+    recipe_amounts = defaultdict(list)
+    for recipe_id, ingredient_id, amount in RecipeIngredient.objects.filter(
+        recipe_id__in=ShoppingCart.objects.values('recipe_id')
+    ).values_list('recipe_id', 'ingredient_id', 'amount').iterator():
+        recipe_amounts[recipe_id].append((ingredient_id, amount))
+    totals = defaultdict(int)
+    for user_id, recipe_id in ShoppingCart.objects.values_list(
+        'user_id', 'recipe_id'
+    ).iterator():
+        for ingredient_id, amount in recipe_amounts[recipe_id]:
+            totals[user_id, ingredient_id] += amount
+    ShoppingCartIngredient.objects.bulk_create([
+        ShoppingCartIngredient(
+            user_id=user_id, ingredient_id=ingredient_id, total_amount=amount
+        )
+        for (user_id, ingredient_id), amount in totals.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0011_recipe_pub_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingCartIngredient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_amount', models.PositiveIntegerField(verbose_name='Общее количество')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_cart_ingredients', to='recipes.ingredient', verbose_name='Ингредиент')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_cart_ingredients', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'ингредиент списка покупок',
+                'verbose_name_plural': 'Ингредиенты списков покупок',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcartingredient',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_user_ingredient'),
+        ),
+        migrations.RunPython(fill_totals,
+                             reverse_code=migrations.RunPython.noop),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 3.2.16 on 2026-10-17 18:30
+
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from recipes.minhash import ingredients_signature, signature_buckets
+
+
+def fill_signatures(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    RecipeSignatureBucket = apps.get_model('recipes', 'RecipeSignatureBucket')
+    ingredients = defaultdict(list)
+    for recipe_id, ingredient_id in RecipeIngredient.objects.values_list(
+        'recipe_id', 'ingredient_id'
+    ).iterator():
+        ingredients[recipe_id].append(ingredient_id)
+    recipes = [
+        Recipe(pk=recipe_id, ingredients_signature=ingredients_signature(
+            ingredient_ids
+        ))
+        for recipe_id, ingredient_ids in ingredients.items()
+    ]
+    Recipe.objects.bulk_update(
+        recipes, ('ingredients_signature',), batch_size=1000
+    )
+    RecipeSignatureBucket.objects.bulk_create([
+        RecipeSignatureBucket(recipe_id=recipe.pk, bucket=bucket)
+        for recipe in recipes
+        for bucket in signature_buckets(recipe.ingredients_signature)
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0015_similarrecipe'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='ingredients_signature',
+            field=models.BinaryField(default=b'', editable=False, verbose_name='MinHash-сигнатура ингредиентов'),
+        ),
+        migrations.CreateModel(
+            name='RecipeSignatureBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.BigIntegerField(db_index=True, verbose_name='Корзина')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='signature_buckets', to='recipes.recipe', verbose_name='Рецепт')),
+            ],
+            options={
+                'verbose_name': 'корзина сигнатуры рецепта',
+                'verbose_name_plural': 'Корзины сигнатур рецептов',
+            },
+        ),
+        migrations.RunPython(fill_signatures,
+                             reverse_code=migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 3.2.16 on 2026-10-17 20:05
+
+import time
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_popularity(apps, schema_editor):
+    RecipePopularity = apps.get_model('recipes', 'RecipePopularity')
+    scores = defaultdict(float)
+    for model_name, weight in settings.POPULARITY_WEIGHTS.items():
+        model = apps.get_model('recipes', model_name)
+        for recipe_id in model.objects.values_list(
+            'recipe_id', flat=True
+        ).iterator():
+            scores[recipe_id] += weight
+    epoch = time.time()
+    RecipePopularity.objects.bulk_create([
+        RecipePopularity(recipe_id=recipe_id, score=score, epoch=epoch)
+        for recipe_id, score in scores.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0017_feedentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipePopularity',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='popularity', serialize=False, to='recipes.recipe', verbose_name='Рецепт')),
+                ('score', models.FloatField(db_index=True, verbose_name='Рейтинг')),
+                ('epoch', models.FloatField(verbose_name='Эпоха рейтинга')),
+            ],
+            options={
+                'verbose_name': 'рейтинг рецепта',
+                'verbose_name_plural': 'Рейтинги рецептов',
+            },
+        ),
+        migrations.RunPython(fill_popularity,
+                             reverse_code=migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.2.16 on 2026-10-17 23:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0018_recipepopularity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='version',
+            field=models.PositiveIntegerField(
+                default=0, editable=False,
+                verbose_name='Версия представления'
+            ),
+        ),
+    ]
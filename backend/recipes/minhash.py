@@ -0,0 +1,59 @@
+import hashlib
+import random
+import struct
+from operator import eq
+
+from recipes.constants import Constants
+
+MERSENNE_PRIME = (1 << 61) - 1
+HASH_MASK = (1 << 32) - 1
+ROWS_PER_BAND = Constants.MINHASH_PERMUTATIONS // Constants.MINHASH_BANDS
+SIGNATURE_FORMAT = f'<{Constants.MINHASH_PERMUTATIONS}I'
+BAND_BYTES = struct.calcsize(f'<{ROWS_PER_BAND}I')
+
+# Коэффициенты хеш-функций (a * x + b) mod p фиксированы: при их
+# изменении сохраненные сигнатуры и корзины нужно пересчитать.
+_random = random.Random(0)
+PERMUTATIONS = tuple(
+    (_random.randrange(1, MERSENNE_PRIME), _random.randrange(MERSENNE_PRIME))
+    for _ in range(Constants.MINHASH_PERMUTATIONS)
+)
+
+
+def ingredients_signature(ingredient_ids):
+    """MinHash набора ингредиентов: минимум каждой хеш-функции по набору."""
+    ingredient_ids = tuple(ingredient_ids)
+    if not ingredient_ids:
+        return b''
+    return struct.pack(SIGNATURE_FORMAT, *(
+        min((a * pk + b) % MERSENNE_PRIME for pk in ingredient_ids)
+        & HASH_MASK
+        for a, b in PERMUTATIONS
+    ))
+
+
+def signature_buckets(signature):
+    """
+    Корзины LSH сигнатуры: хеш каждой полосы вместе с ее номером.
+
+    Рецепты со сходством s попадают хотя бы в одну общую корзину
+    с вероятностью 1 - (1 - s ** r) ** b.
+    """
+    return [
+        int.from_bytes(hashlib.blake2b(
+            bytes((band,)) + signature[start:start + BAND_BYTES],
+            digest_size=8
+        ).digest(), 'big', signed=True)
+        for band, start in enumerate(range(0, len(signature), BAND_BYTES))
+    ]
+
+
+def estimate_similarity(first, second):
+    """Оценка коэффициента Жаккара - доля совпавших значений сигнатур."""
+    if not first or not second:
+        return 0.0
+    return sum(map(
+        eq,
+        struct.unpack(SIGNATURE_FORMAT, first),
+        struct.unpack(SIGNATURE_FORMAT, second)
+    )) / Constants.MINHASH_PERMUTATIONS
@@ -3,6 +3,7 @@ from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
 
 from recipes.constants import Constants
+from users.models import CountersMixin
 
 
 class AbstractTitle(models.Model):
@@ -99,7 +100,7 @@ class RecipeIngredient(models.Model):
         )
 
 
-class Recipe(AbstractTitle):
+class Recipe(CountersMixin, AbstractTitle):
     """Модель для рецептов."""
 
     tags = models.ManyToManyField(
@@ -135,11 +136,45 @@ class Recipe(AbstractTitle):
     pub_date = models.DateTimeField(
         'Дата публикации', auto_now_add=True
     )
+    favorites_count = models.PositiveIntegerField(
+        'Количество добавлений в избранное',
+        default=0,
+        editable=False,
+    )
+    ingredients_signature = models.BinaryField(
+        'MinHash-сигнатура ингредиентов',
+        default=b'',
+        editable=False,
+    )
+    version = models.PositiveIntegerField(
+        'Версия представления',
+        default=0,
+        editable=False,
+    )
+    image_rendered = models.CharField(
+        'Изображение с уменьшенными копиями',
+        max_length=100,
+        blank=True,
+        default='',
+        editable=False,
+    )
+
+    counter_fields = ('favorites_count', 'version', 'image_rendered')
 
     class Meta(AbstractTitle.Meta):
         verbose_name = 'рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-pub_date',)
+        indexes = (
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='recipe_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='recipe_author_pub_date_idx'
+            ),
+        )
 
 
 class AbstractUserRecipe(models.Model):
@@ -189,3 +224,175 @@ class Favorite(AbstractUserRecipe):
     class Meta(AbstractUserRecipe.Meta):
         verbose_name = 'рецепт в избранном'
         verbose_name_plural = 'Рецепты в избранном'
+
+
+class SimilarRecipe(models.Model):
+    """
+    Модель для похожих рецептов.
+
+    Заполняется командой build_similar_recipes: для каждого рецепта
+    хранятся ближайшие по совместным добавлениям рецепты.
+    """
+
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт',
+        related_name='similar_recipes',
+        db_index=False
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        verbose_name='Похожий рецепт',
+        related_name='similar_to'
+    )
+    score = models.FloatField('Сходство')
+
+    class Meta:
+        verbose_name = 'похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        ordering = ('recipe', '-score')
+        indexes = (
+            models.Index(
+                fields=('recipe', '-score'),
+                name='similar_recipe_score_idx'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.recipe_id} -> {self.similar_id}: {self.score:.3f}'
+
+
+class RecipeSignatureBucket(models.Model):
+    """
+    Модель для LSH-индекса сигнатур ингредиентов.
+
+    Рецепт попадает в одну корзину на каждую полосу сигнатуры,
+    кандидаты в похожие - рецепты с общими корзинами.
+    """
+
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт',
+        related_name='signature_buckets'
+    )
+    bucket = models.BigIntegerField('Корзина', db_index=True)
+
+    class Meta:
+        verbose_name = 'корзина сигнатуры рецепта'
+        verbose_name_plural = 'Корзины сигнатур рецептов'
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.bucket}'
+
+
+class FeedEntry(models.Model):
+    """
+    Модель для ленты подписок.
+
+    Строка добавляется каждому подписчику при публикации рецепта,
+    дата публикации и автор копируются для чтения ленты по индексу.
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+        related_name='feed_entries',
+        db_index=False
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт',
+        related_name='feed_entries'
+    )
+    author = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        verbose_name='Автор',
+        related_name='+',
+        db_index=False
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        verbose_name = 'запись ленты'
+        verbose_name_plural = 'Записи лент'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_feed_entry'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date', '-recipe'),
+                name='feed_entry_user_pub_date_idx'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.user_id}: {self.recipe_id}'
+
+
+class RecipePopularity(models.Model):
+    """
+    Модель для рейтинга популярности рецептов.
+
+    Рейтинг - сумма весов добавлений в избранное и в список покупок,
+    затухающих со временем. Веса отсчитываются от эпохи строки.
+    """
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        verbose_name='Рецепт',
+        related_name='popularity'
+    )
+    score = models.FloatField('Рейтинг', db_index=True)
+    epoch = models.FloatField('Эпоха рейтинга')
+
+    class Meta:
+        verbose_name = 'рейтинг рецепта'
+        verbose_name_plural = 'Рейтинги рецептов'
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.score:.3f}'
+
+
+class ShoppingCartIngredient(models.Model):
+    """Модель для итогового количества ингредиента в списке покупок."""
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+        related_name='shopping_cart_ingredients'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='Ингредиент',
+        related_name='shopping_cart_ingredients'
+    )
+    total_amount = models.PositiveIntegerField('Общее количество')
+
+    class Meta:
+        verbose_name = 'ингредиент списка покупок'
+        verbose_name_plural = 'Ингредиенты списков покупок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_user_ingredient'
+            ),
+        )
+
+    def __str__(self):
+        return (
+            f'{self.ingredient.name} — {self.total_amount} '
+            f'{self.ingredient.measurement_unit}'.strip()
+        )
@@ -0,0 +1,103 @@
+import math
+import time
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Value
+from django.db.models.functions import Exp
+
+from recipes.constants import Constants
+from recipes.models import Recipe, RecipePopularity
+
+EPOCH_KEY = 'popularity:epoch'
+
+
+def decay_rate():
+    return math.log(2) / settings.POPULARITY_HALF_LIFE
+
+
+def get_epoch():
+    """Текущая эпоха рейтинга: из кэша или из таблицы рейтингов."""
+    epoch = cache.get(EPOCH_KEY)
+    if epoch is None:
+        epoch = RecipePopularity.objects.values_list(
+            'epoch', flat=True
+        ).first() or time.time()
+        cache.add(EPOCH_KEY, epoch, None)
+    return epoch
+
+
+def event_weight(weight):
+    """Вес события сейчас относительно эпохи строки рейтинга."""
+    return Value(weight) * Exp(
+        (Value(time.time()) - F('epoch')) * Value(decay_rate())
+    )
+
+
+def add_popularity(recipe_id, weight):
+    """
+    Добавляет рецепту событие с весом weight.
+
+    Вес события растет экспоненциально от эпохи (forward decay),
+    поэтому порядок по score совпадает с порядком по рейтингу,
+    затухающему со временем, и обслуживается индексом.
+    """
+    queryset = RecipePopularity.objects.filter(recipe_id=recipe_id)
+    if queryset.update(score=F('score') + event_weight(weight)):
+        return
+    RecipePopularity.objects.bulk_create([RecipePopularity(
+        recipe_id=recipe_id, score=0, epoch=get_epoch()
+    )], ignore_conflicts=True)
+    queryset.update(score=F('score') + event_weight(weight))
+
+
+def compact_popularity():
+    """
+    Переносит эпоху рейтинга на текущий момент.
+
+    Рейтинги умножаются на затухание с их эпохи, чтобы они не росли
+    неограниченно, а строки с пренебрежимо малым рейтингом удаляются.
+    """
+    epoch = time.time()
+    with transaction.atomic():
+        rescaled = RecipePopularity.objects.update(
+            score=F('score') * Exp(
+                (F('epoch') - Value(epoch)) * Value(decay_rate())
+            ),
+            epoch=epoch
+        )
+        deleted, _ = RecipePopularity.objects.filter(
+            score__lt=settings.POPULARITY_MIN_SCORE
+        ).delete()
+        transaction.on_commit(lambda: cache.set(EPOCH_KEY, epoch, None))
+    return rescaled - deleted, deleted
+
+
+def popular_recipes_key(tags):
+    return f'popularity:top:{md5(",".join(tags).encode()).hexdigest()}'
+
+
+def get_popular_recipe_ids(tags):
+    """
+    Возвращает id самых популярных рецептов с любым из тегов tags.
+
+    Список для каждого набора тегов кэшируется на короткое время.
+    """
+    tags = sorted(set(tags))
+    key = popular_recipes_key(tags)
+    ids = cache.get(key)
+    if ids is None:
+        queryset = RecipePopularity.objects.filter(score__gt=0)
+        if tags:
+            queryset = queryset.filter(Exists(
+                Recipe.tags.through.objects.filter(
+                    recipe_id=OuterRef('recipe_id'), tag__slug__in=tags
+                )
+            ))
+        ids = list(queryset.order_by('-score', '-recipe_id').values_list(
+            'recipe_id', flat=True
+        )[:Constants.MAX_POPULAR_RECIPES])
+        cache.set(key, ids, settings.POPULAR_CACHE_TIMEOUT)
+    return ids
@@ -0,0 +1,110 @@
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Value
+from django.db.models.expressions import RawSQL
+
+SEARCH_CONFIG = 'russian'
+
+SQLITE_TRIGGERS = (
+    '''
+    CREATE TRIGGER IF NOT EXISTS recipes_recipe_fts_insert
+    AFTER INSERT ON recipes_recipe
+    BEGIN
+        INSERT INTO recipes_recipe_fts(rowid, name, text)
+        VALUES (new.id, new.name, new.text);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS recipes_recipe_fts_delete
+    AFTER DELETE ON recipes_recipe
+    BEGIN
+        INSERT INTO recipes_recipe_fts(recipes_recipe_fts, rowid, name, text)
+        VALUES ('delete', old.id, old.name, old.text);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS recipes_recipe_fts_update
+    AFTER UPDATE OF name, text ON recipes_recipe
+    BEGIN
+        INSERT INTO recipes_recipe_fts(recipes_recipe_fts, rowid, name, text)
+        VALUES ('delete', old.id, old.name, old.text);
+        INSERT INTO recipes_recipe_fts(rowid, name, text)
+        VALUES (new.id, new.name, new.text);
+    END
+    ''',
+)
+
+
+def ensure_sqlite_triggers(connection):
+    """
+    Восстанавливает триггеры FTS5 в SQLite.
+
+    SQLite пересоздает таблицу рецептов при изменении схемы,
+    и триггеры удаляются вместе со старой таблицей.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        if 'recipes_recipe_fts' not in connection.introspection.table_names(
+            cursor
+        ):
+            return
+        for statement in SQLITE_TRIGGERS:
+            cursor.execute(statement)
+
+
+def fts5_query(query):
+    """Строит запрос FTS5: все слова как префиксы, без операторов."""
+    return ' '.join(f'"{word}"*' for word in re.findall(r'\w+', query))
+
+
+def search_filter(query):
+    """
+    Условие полнотекстового поиска по таблице рецептов без псевдонима.
+
+    Возвращает None, если в запросе нет слов для поиска в SQLite.
+    """
+    if connection.vendor == 'postgresql':
+        return RawSQL(
+            '"recipes_recipe"."search_vector" '
+            '@@ websearch_to_tsquery(%s, %s)', (SEARCH_CONFIG, query),
+            output_field=BooleanField()
+        )
+    match = fts5_query(query)
+    if not match:
+        return None
+    return RawSQL(
+        '"recipes_recipe"."id" IN (SELECT rowid FROM recipes_recipe_fts '
+        'WHERE recipes_recipe_fts MATCH %s)', (match,),
+        output_field=BooleanField()
+    )
+
+
+def search_recipes(queryset, query):
+    """
+    Фильтрует рецепты по полнотекстовому запросу и добавляет search_rank.
+
+    В PostgreSQL используется столбец search_vector с русской морфологией
+    и GIN-индексом, в SQLite - таблица FTS5 с поиском по префиксам слов.
+    Совпадения в названии весят больше, чем в описании.
+    """
+    matches = search_filter(query)
+    if matches is None:
+        return queryset.annotate(
+            search_rank=Value(0.0, output_field=FloatField())
+        ).none()
+    if connection.vendor == 'postgresql':
+        rank = RawSQL(
+            'ts_rank_cd("recipes_recipe"."search_vector", '
+            'websearch_to_tsquery(%s, %s))', (SEARCH_CONFIG, query),
+            output_field=FloatField()
+        )
+    else:
+        rank = RawSQL(
+            '(SELECT -bm25(recipes_recipe_fts, 10.0, 1.0) '
+            'FROM recipes_recipe_fts WHERE recipes_recipe_fts MATCH %s '
+            'AND rowid = "recipes_recipe"."id")', (fts5_query(query),),
+            output_field=FloatField()
+        )
+    return queryset.filter(matches).annotate(search_rank=rank)
@@ -0,0 +1,333 @@
+import threading
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from recipes.models import (Favorite, Recipe, RecipeIngredient, ShoppingCart,
+                            ShoppingCartIngredient)
+from users.models import Follow, User
+
+COUNTERS = (
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Follow, 'author'),
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+)
+
+RECIPE_IDS_VERSION_KEY = 'recipe-ids:version'
+
+RECIPE_IDS_SEQUENCE_KEY = 'recipe-ids:sequence'
+
+RECIPE_INGREDIENTS_VERSION_KEY = 'recipe-ingredients:version'
+
+RECIPE_INGREDIENTS_SEQUENCE_KEY = 'recipe-ingredients:sequence'
+
+_recipe_ids = None
+_recipe_ids_lock = threading.Lock()
+
+
+def shopping_cart_version_key(user_id):
+    return f'shopping-cart:{user_id}:version'
+
+
+def get_shopping_cart_version(user_id):
+    """Возвращает токен, который меняется с каждым изменением итогов."""
+    return cache.get_or_set(
+        shopping_cart_version_key(user_id), uuid4().hex, None
+    )
+
+
+def bump_shopping_cart_versions(user_ids):
+    """Меняет токены пользователей после фиксации транзакции."""
+    versions = {
+        shopping_cart_version_key(user_id): uuid4().hex
+        for user_id in user_ids
+    }
+    transaction.on_commit(lambda: cache.set_many(versions, None))
+
+
+def get_recipe_amounts(recipe_id):
+    """Возвращает количества ингредиентов рецепта {ingredient_id: amount}."""
+    return dict(RecipeIngredient.objects.filter(
+        recipe_id=recipe_id
+    ).values_list('ingredient_id', 'amount'))
+
+
+def calculate_shopping_cart_totals(user_ids=None):
+    """Считает итоги списков покупок по исходным данным."""
+    queryset = RecipeIngredient.objects.all()
+    if user_ids is not None:
+        queryset = queryset.filter(recipe__shoppingcarts__user__in=user_ids)
+    return {
+        (row['user_id'], row['ingredient_id']): row['total_amount']
+        for row in queryset.values(
+            'ingredient_id', user_id=F('recipe__shoppingcarts__user')
+        ).annotate(total_amount=Sum('amount')).exclude(user_id=None)
+    }
+
+
+def apply_shopping_cart_delta(user_ids, delta):
+    """
+    Прибавляет изменения {ingredient_id: amount} к итогам пользователей.
+
+    Вызывается внутри транзакции, которая меняет корзину или рецепт.
+    Строки пользователей блокируются в порядке id: select_for_update
+    итогов не защищает от двух вставок одной еще не существующей строки.
+    """
+    delta = {pk: amount for pk, amount in delta.items() if amount}
+    if not user_ids or not delta:
+        return
+    list(User.objects.select_for_update().filter(
+        pk__in=user_ids
+    ).order_by('pk').values_list('pk', flat=True))
+    rows = {
+        (row.user_id, row.ingredient_id): row
+        for row in ShoppingCartIngredient.objects.select_for_update().filter(
+            user_id__in=user_ids, ingredient_id__in=delta
+        )
+    }
+    to_create, to_update, to_delete = [], [], []
+    for user_id in user_ids:
+        for ingredient_id, amount in delta.items():
+            row = rows.get((user_id, ingredient_id))
+            if row is None:
+                if amount > 0:
+                    to_create.append(ShoppingCartIngredient(
+                        user_id=user_id,
+                        ingredient_id=ingredient_id,
+                        total_amount=amount
+                    ))
+            elif row.total_amount + amount > 0:
+                row.total_amount += amount
+                to_update.append(row)
+            else:
+                to_delete.append(row.pk)
+    ShoppingCartIngredient.objects.bulk_create(to_create)
+    ShoppingCartIngredient.objects.bulk_update(to_update, ('total_amount',))
+    ShoppingCartIngredient.objects.filter(pk__in=to_delete).delete()
+    bump_shopping_cart_versions(user_ids)
+
+
+def update_shopping_cart_totals(recipe_id, old_amounts, new_amounts=None):
+    """Переносит изменение ингредиентов рецепта в итоги его корзин."""
+    if new_amounts is None:
+        new_amounts = get_recipe_amounts(recipe_id)
+    delta = dict(new_amounts)
+    for ingredient_id, amount in old_amounts.items():
+        delta[ingredient_id] = delta.get(ingredient_id, 0) - amount
+    apply_shopping_cart_delta(
+        list(ShoppingCart.objects.filter(
+            recipe_id=recipe_id
+        ).values_list('user_id', flat=True)),
+        delta
+    )
+
+
+def count_subquery(queryset, field):
+    """Подзапрос количества связанных строк для внешней модели."""
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')}).order_by()
+        .values(field).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+def recalculate_counters(dry_run=False):
+    """
+    Пересчитывает денормализованные счетчики.
+
+    Возвращает количество расходящихся строк для каждого счетчика.
+    """
+    drift = {}
+    for model, field, related_model, related_field in COUNTERS:
+        expected = count_subquery(related_model.objects.all(), related_field)
+        drifted = model.objects.annotate(expected=expected).exclude(
+            **{field: F('expected')}
+        )
+        drift[f'{model.__name__}.{field}'] = drifted.count()
+        if not dry_run:
+            model.objects.filter(pk__in=drifted.values('pk')).update(
+                **{field: expected}
+            )
+    return drift
+
+
+def recipe_ids_key(version):
+    return f'recipe-ids:bitmap:{version}'
+
+
+def recipe_ids_log_key(sequence):
+    return f'recipe-ids:log:{sequence}'
+
+
+class RecipeIdBitmap:
+    """
+    Битовая карта id существующих рецептов.
+
+    Миллион рецептов занимает около 125 КБ. sequence - номер последней
+    примененной записи журнала созданных и удаленных рецептов.
+    """
+
+    def __init__(self, bits, max_id, version, sequence):
+        self.bits = bits
+        self.max_id = max_id
+        self.version = version
+        self.sequence = sequence
+
+    @classmethod
+    def build(cls, version, sequence):
+        bitmap = cls(bytearray(1), 0, version, sequence)
+        bitmap.apply(
+            (pk, True) for pk in
+            Recipe.objects.order_by().values_list('id', flat=True)
+        )
+        return bitmap
+
+    def apply(self, changes):
+        """Устанавливает или сбрасывает биты [(id рецепта, есть ли он)]."""
+        for pk, present in changes:
+            if len(self.bits) <= pk >> 3:
+                self.bits.extend(bytes((pk >> 3) + 1 - len(self.bits)))
+            if present:
+                self.bits[pk >> 3] |= 1 << (pk & 7)
+                self.max_id = max(self.max_id, pk)
+            else:
+                self.bits[pk >> 3] &= ~(1 << (pk & 7)) & 0xFF
+
+    def __contains__(self, pk):
+        return 0 < pk <= self.max_id and bool(
+            self.bits[pk >> 3] & 1 << (pk & 7)
+        )
+
+
+def get_recipe_ids():
+    """
+    Возвращает актуальную карту id рецептов.
+
+    Карта хранится в памяти процесса и в общем кэше и строится запросом
+    к БД один раз на версию. Созданные и удаленные рецепты применяются
+    к ней из журнала, а при разрыве журнала или слишком большом
+    отставании карта строится заново.
+    """
+    global _recipe_ids
+    with _recipe_ids_lock:
+        state = cache.get_many(
+            (RECIPE_IDS_VERSION_KEY, RECIPE_IDS_SEQUENCE_KEY)
+        )
+        version = state.get(RECIPE_IDS_VERSION_KEY) or cache.get_or_set(
+            RECIPE_IDS_VERSION_KEY, uuid4().hex, None
+        )
+        sequence = state.get(RECIPE_IDS_SEQUENCE_KEY)
+        if sequence is None:
+            sequence = cache.get_or_set(RECIPE_IDS_SEQUENCE_KEY, 0, None)
+        bitmap = _recipe_ids
+        if bitmap is None or bitmap.version != version:
+            cached = cache.get(recipe_ids_key(version))
+            bitmap = None if cached is None else RecipeIdBitmap(
+                bytearray(cached[0]), cached[1], version, cached[2]
+            )
+        if bitmap is not None and bitmap.sequence < sequence and (
+            sequence - bitmap.sequence <= settings.RECIPE_IDS_LOG_LIMIT
+        ):
+            keys = [
+                recipe_ids_log_key(number)
+                for number in range(bitmap.sequence + 1, sequence + 1)
+            ]
+            entries = cache.get_many(keys)
+            if len(entries) == len(keys):
+                for key in keys:
+                    bitmap.apply(entries[key])
+                bitmap.sequence = sequence
+        if bitmap is None or bitmap.sequence != sequence:
+            bitmap = RecipeIdBitmap.build(version, sequence)
+            cache.set(
+                recipe_ids_key(version),
+                (bytes(bitmap.bits), bitmap.max_id, bitmap.sequence),
+                settings.SHORT_LINK_CACHE_TIMEOUT
+            )
+        _recipe_ids = bitmap
+        return bitmap
+
+
+def bump_recipe_ids_version():
+    """Меняет версию карты id рецептов после фиксации транзакции."""
+    version = uuid4().hex
+    transaction.on_commit(
+        lambda: cache.set(RECIPE_IDS_VERSION_KEY, version, None)
+    )
+
+
+def log_recipe_id(recipe_id, present):
+    """Записывает в журнал созданный или удаленный рецепт."""
+
+    def write():
+        cache.add(RECIPE_IDS_SEQUENCE_KEY, 0, None)
+        sequence = cache.incr(RECIPE_IDS_SEQUENCE_KEY)
+        cache.set(
+            recipe_ids_log_key(sequence), [(recipe_id, present)],
+            settings.RECIPE_IDS_LOG_TIMEOUT
+        )
+
+    transaction.on_commit(write)
+
+
+def recipe_exists(recipe_id):
+    """
+    Проверяет существование рецепта по карте id без запроса к БД.
+
+    Карта актуальна на момент вызова, поэтому id больше max_id
+    отклоняются сразу.
+    """
+    return recipe_id in get_recipe_ids()
+
+
+def recipe_ingredients_log_key(sequence):
+    return f'recipe-ingredients:log:{sequence}'
+
+
+def start_recipe_ingredients_log():
+    """
+    Начинает журнал изменений состава, если его номера нет в кэше.
+
+    После очистки кэша номера записей начинаются заново, поэтому
+    журнал получает новую версию.
+    """
+    if cache.add(RECIPE_INGREDIENTS_SEQUENCE_KEY, 0, None):
+        cache.set(RECIPE_INGREDIENTS_VERSION_KEY, uuid4().hex, None)
+
+
+def get_recipe_ingredients_state():
+    """Возвращает версию журнала изменений состава и номер его записи."""
+    keys = (RECIPE_INGREDIENTS_VERSION_KEY, RECIPE_INGREDIENTS_SEQUENCE_KEY)
+    state = cache.get_many(keys)
+    if RECIPE_INGREDIENTS_SEQUENCE_KEY not in state:
+        start_recipe_ingredients_log()
+        state = cache.get_many(keys)
+    version = state.get(RECIPE_INGREDIENTS_VERSION_KEY) or cache.get_or_set(
+        RECIPE_INGREDIENTS_VERSION_KEY, uuid4().hex, None
+    )
+    return version, state.get(RECIPE_INGREDIENTS_SEQUENCE_KEY, 0)
+
+
+def log_recipe_ingredients(pairs):
+    """
+    Записывает в журнал затронутые пары (recipe_id, ingredient_id).
+
+    Журнал в общем кэше позволяет процессам обновлять свои индексы
+    состава рецептов без полного перестроения.
+    """
+    pairs = [list(pair) for pair in pairs]
+    if not pairs:
+        return
+
+    def write():
+        start_recipe_ingredients_log()
+        sequence = cache.incr(RECIPE_INGREDIENTS_SEQUENCE_KEY)
+        cache.set(
+            recipe_ingredients_log_key(sequence), pairs,
+            settings.RECIPE_INGREDIENTS_LOG_TIMEOUT
+        )
+
+    transaction.on_commit(write)
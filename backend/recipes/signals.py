@@ -0,0 +1,149 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.db.models import F
+from django.db.models.signals import (post_delete, post_migrate, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+
+from recipes.feed import fan_out_recipe, schedule, schedule_author_backfill
+from recipes.models import Favorite, Recipe, RecipeIngredient, ShoppingCart
+from recipes.popularity import add_popularity
+from recipes.search import ensure_sqlite_triggers
+from recipes.services import (apply_shopping_cart_delta, get_recipe_amounts,
+                              log_recipe_id, log_recipe_ingredients)
+
+User = get_user_model()
+
+
+@receiver(pre_save, sender=ShoppingCart)
+def remember_shopping_cart(sender, instance, **kwargs):
+    if instance.pk is None:
+        return
+    instance.old_item = ShoppingCart.objects.filter(
+        pk=instance.pk
+    ).values_list('user_id', 'recipe_id').first()
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_to_shopping_cart_totals(sender, instance, created, **kwargs):
+    item = (instance.user_id, instance.recipe_id)
+    old_item = getattr(instance, 'old_item', None)
+    changes = [(item, 1)]
+    if old_item is not None:
+        if old_item == item:
+            return
+        changes.append((old_item, -1))
+    deltas = {}
+    for (user_id, recipe_id), sign in changes:
+        delta = deltas.setdefault(user_id, {})
+        for ingredient_id, amount in get_recipe_amounts(recipe_id).items():
+            delta[ingredient_id] = delta.get(ingredient_id, 0) + sign * amount
+    for user_id in sorted(deltas):
+        apply_shopping_cart_delta([user_id], deltas[user_id])
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def remove_from_shopping_cart_totals(sender, instance, **kwargs):
+    apply_shopping_cart_delta([instance.user_id], {
+        ingredient_id: -amount for ingredient_id, amount
+        in get_recipe_amounts(instance.recipe_id).items()
+    })
+
+
+@receiver(pre_save, sender=Recipe)
+def remember_recipe_author(sender, instance, **kwargs):
+    if instance.pk is None:
+        return
+    instance.old_author_id = Recipe.objects.filter(
+        pk=instance.pk
+    ).values_list('author_id', flat=True).first()
+
+
+@receiver(post_save, sender=Recipe)
+def count_saved_recipe(sender, instance, created, **kwargs):
+    old_author_id = getattr(instance, 'old_author_id', None)
+    if not created and old_author_id in (None, instance.author_id):
+        return
+    User.objects.filter(pk=instance.author_id).update(
+        recipes_count=F('recipes_count') + 1
+    )
+    if old_author_id is not None:
+        User.objects.filter(pk=old_author_id, recipes_count__gt=0).update(
+            recipes_count=F('recipes_count') - 1
+        )
+        schedule_author_backfill(old_author_id, 'recipes_count')
+
+
+@receiver(post_delete, sender=Recipe)
+def count_deleted_recipe(sender, instance, **kwargs):
+    User.objects.filter(pk=instance.author_id, recipes_count__gt=0).update(
+        recipes_count=F('recipes_count') - 1
+    )
+    schedule_author_backfill(instance.author_id, 'recipes_count')
+
+
+@receiver(post_save, sender=Recipe)
+def add_recipe_id(sender, instance, created, **kwargs):
+    if created:
+        log_recipe_id(instance.pk, True)
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_recipe_id(sender, instance, **kwargs):
+    log_recipe_id(instance.pk, False)
+
+
+@receiver(post_save, sender=Recipe)
+def add_recipe_to_feeds(sender, instance, created, **kwargs):
+    if created:
+        schedule(fan_out_recipe, instance.pk)
+
+
+@receiver(post_save, sender=Favorite)
+def count_saved_favorite(sender, instance, created, **kwargs):
+    if created:
+        Recipe.objects.filter(pk=instance.recipe_id).update(
+            favorites_count=F('favorites_count') + 1
+        )
+
+
+@receiver(post_delete, sender=Favorite)
+def count_deleted_favorite(sender, instance, **kwargs):
+    Recipe.objects.filter(
+        pk=instance.recipe_id, favorites_count__gt=0
+    ).update(favorites_count=F('favorites_count') - 1)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+def add_recipe_popularity(sender, instance, created, **kwargs):
+    if created:
+        add_popularity(
+            instance.recipe_id,
+            settings.POPULARITY_WEIGHTS[sender._meta.model_name]
+        )
+
+
+@receiver(pre_save, sender=RecipeIngredient)
+def remember_recipe_ingredient(sender, instance, **kwargs):
+    if instance.pk is None:
+        return
+    instance.old_pair = RecipeIngredient.objects.filter(
+        pk=instance.pk
+    ).values_list('recipe_id', 'ingredient_id').first()
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def log_recipe_ingredient(sender, instance, **kwargs):
+    pairs = {(instance.recipe_id, instance.ingredient_id)}
+    if getattr(instance, 'old_pair', None):
+        pairs.add(instance.old_pair)
+    log_recipe_ingredients(pairs)
+
+
+@receiver(post_migrate)
+def restore_search_triggers(sender, using, **kwargs):
+    if sender.name == 'recipes':
+        ensure_sqlite_triggers(connections[using])
@@ -0,0 +1,132 @@
+import heapq
+import math
+from array import array
+from collections import Counter
+from itertools import chain, groupby
+from operator import itemgetter, mul
+
+from django.db.models import Count
+
+from recipes.constants import Constants
+from recipes.minhash import (estimate_similarity, ingredients_signature,
+                             signature_buckets)
+from recipes.models import (Favorite, Recipe, RecipeIngredient,
+                            RecipeSignatureBucket, ShoppingCart)
+
+
+def load_interactions(max_user_items):
+    """
+    Загружает разреженную матрицу пользователь x рецепт.
+
+    Взаимодействие - рецепт в избранном или в списке покупок.
+    Возвращает строки матрицы (массивы id рецептов пользователей),
+    столбцы (рецепт -> массив номеров строк) и число пользователей
+    каждого рецепта. Пользователи, у которых рецептов больше
+    max_user_items, пропускаются: подсчет пар растет квадратично
+    от длины строки, а вклад таких пользователей в сходство мал.
+    """
+    rows = Favorite.objects.order_by().values_list(
+        'user_id', 'recipe_id'
+    ).union(
+        ShoppingCart.objects.order_by().values_list('user_id', 'recipe_id')
+    ).order_by('user_id')
+    user_items = []
+    recipe_users = {}
+    norms = Counter()
+    for _, group in groupby(rows.iterator(), key=itemgetter(0)):
+        items = array('q', map(itemgetter(1), group))
+        if len(items) > max_user_items:
+            continue
+        norms.update(items)
+        if len(items) < 2:
+            continue
+        row = len(user_items)
+        user_items.append(items)
+        for recipe_id in items:
+            recipe_users.setdefault(recipe_id, array('q')).append(row)
+    return user_items, recipe_users, norms
+
+
+def iter_neighbours(user_items, recipe_users, norms, top_k):
+    """
+    Возвращает (рецепт, [(сходство, id похожего рецепта), ...]).
+
+    Косинусная мера бинарных столбцов: число общих пользователей,
+    деленное на корень из произведения чисел пользователей рецептов.
+    Общие пользователи считаются Counter по строкам пользователей
+    рецепта, нормировка и отбор top_k - map и heapq без цикла Python
+    по кандидатам.
+    """
+    inverse_norms = {
+        recipe_id: 1 / math.sqrt(count) for recipe_id, count in norms.items()
+    }
+    for recipe_id, rows in recipe_users.items():
+        common = Counter(
+            chain.from_iterable(map(user_items.__getitem__, rows))
+        )
+        del common[recipe_id]
+        weight = inverse_norms[recipe_id]
+        yield recipe_id, [
+            (score * weight, similar_id)
+            for score, similar_id in heapq.nlargest(top_k, zip(
+                map(mul, common.values(),
+                    map(inverse_norms.__getitem__, common)),
+                common
+            ))
+        ]
+
+
+def index_signatures(signatures, replace=True):
+    """Записывает корзины LSH для сигнатур рецептов {id: сигнатура}."""
+    if replace:
+        RecipeSignatureBucket.objects.filter(recipe_id__in=signatures).delete()
+    RecipeSignatureBucket.objects.bulk_create([
+        RecipeSignatureBucket(recipe_id=recipe_id, bucket=bucket)
+        for recipe_id, signature in signatures.items()
+        for bucket in signature_buckets(signature)
+    ])
+
+
+def update_signatures(recipe_ids):
+    """Пересчитывает сигнатуры рецептов по их ингредиентам в БД."""
+    ingredients = {recipe_id: [] for recipe_id in recipe_ids}
+    for recipe_id, ingredient_id in RecipeIngredient.objects.filter(
+        recipe_id__in=ingredients
+    ).values_list('recipe_id', 'ingredient_id'):
+        ingredients[recipe_id].append(ingredient_id)
+    signatures = {
+        recipe_id: ingredients_signature(ingredient_ids)
+        for recipe_id, ingredient_ids in ingredients.items()
+    }
+    Recipe.objects.bulk_update([
+        Recipe(pk=recipe_id, ingredients_signature=signature)
+        for recipe_id, signature in signatures.items()
+    ], ('ingredients_signature',))
+    index_signatures(signatures)
+
+
+def find_similar_by_ingredients(signature, exclude_id=None,
+                                min_similarity=0.0,
+                                limit=Constants.SIMILAR_RECIPES_COUNT):
+    """
+    Возвращает [(сходство, id рецепта), ...] по убыванию сходства.
+
+    Кандидаты - рецепты с общими корзинами LSH, первыми берутся
+    рецепты с наибольшим их числом; сходство оценивается по сигнатурам.
+    """
+    if not signature:
+        return []
+    signature = bytes(signature)
+    candidates = Recipe.objects.filter(
+        signature_buckets__bucket__in=signature_buckets(signature)
+    ).exclude(pk=exclude_id).values_list(
+        'id', 'ingredients_signature'
+    ).annotate(
+        shared=Count('id')
+    ).order_by('-shared')[:Constants.MAX_SIMILAR_CANDIDATES]
+    similar = []
+    for recipe_id, candidate, _ in candidates:
+        similarity = estimate_similarity(signature, bytes(candidate))
+        if similarity >= min_similarity:
+            similar.append((similarity, recipe_id))
+    return heapq.nlargest(limit, similar)
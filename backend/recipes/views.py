@@ -1,16 +1,27 @@
-from django.http import HttpResponse, HttpResponsePermanentRedirect
-from django.shortcuts import get_object_or_404
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponsePermanentRedirect
+from django.utils.cache import patch_cache_control
 from django.utils.http import base36_to_int
 
-from recipes.models import Recipe
+from recipes.services import recipe_exists
 
 
 def short_link_redirect(request, short_link_id):
-    """Перенаправляет пользователя на рецепт по короткой ссылке."""
+    """
+    Перенаправляет пользователя на рецепт по короткой ссылке.
+
+    Существование рецепта проверяется по карте id без запроса к БД.
+    """
     try:
         recipe_id = base36_to_int(short_link_id)
     except ValueError:
         return HttpResponse('Некорректная ссылка', status=400)
-    return HttpResponsePermanentRedirect(request.build_absolute_uri(
-        f'/recipes/{get_object_or_404(Recipe, pk=recipe_id).id}'
-    ))
+    if not recipe_exists(recipe_id):
+        raise Http404
+    response = HttpResponsePermanentRedirect(
+        request.build_absolute_uri(f'/recipes/{recipe_id}')
+    )
+    patch_cache_control(
+        response, public=True, max_age=settings.SHORT_LINK_CACHE_TIMEOUT
+    )
+    return response
@@ -2,6 +2,8 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.utils.safestring import mark_safe
 
+from recipes.admin import (AuthorFilter, EstimatedCountPaginator,
+                           LargeTableAdmin, UserFilter)
 from users.models import Follow, User
 
 
@@ -20,8 +22,10 @@ class UserAdmin(BaseUserAdmin):
         'followers_count'
     )
     empty_value_display = 'значение отсутствует'
-    list_filter = ('username',)
+    list_filter = ('is_staff', 'is_active')
     search_fields = ('username', 'email')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     @admin.display(description='Аватар')
     def avatar_preview(self, obj):
@@ -31,19 +35,13 @@ class UserAdmin(BaseUserAdmin):
             )
         return ''
 
-    @admin.display(description='Кол-во рецептов у пользователя')
-    def recipes_count(self, obj):
-        return obj.recipes.count()
-
-    @admin.display(description='Кол-во подписчиков у пользователя')
-    def followers_count(self, obj):
-        return obj.subscriptions_to_author.count()
-
 
 @admin.register(Follow)
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(LargeTableAdmin):
     """Административный интерфейс для управления подписками."""
 
     list_display = ('id', 'user', 'author')
-    search_fields = ('user__username', 'author__username')
-    list_filter = ('user', 'author')
+    list_select_related = ('user', 'author')
+    search_fields = ('=user__username', '=author__username')
+    list_filter = (UserFilter, AuthorFilter)
+    autocomplete_fields = ('user', 'author')
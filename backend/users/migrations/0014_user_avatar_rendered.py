@@ -0,0 +1,21 @@
+# Generated by Django 3.2.16 on 2026-10-17 23:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0013_user_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='avatar_rendered',
+            field=models.CharField(
+                blank=True, default='', editable=False, max_length=100,
+                verbose_name='Аватар с уменьшенными копиями'
+            ),
+        ),
+    ]
@@ -7,7 +7,34 @@ from django.db import models
 from users.constants import LIMIT_EMAIL, LIMIT_USERNAME
 
 
-class User(AbstractUser):
+class CountersMixin:
+    """
+    Исключает счетчики из обычного сохранения загруженного объекта.
+
+    Счетчики и другие поля counter_fields меняются только запросами
+    update, иначе save() записал бы устаревшее значение, прочитанное
+    вместе с объектом.
+    """
+
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (
+            kwargs.get('update_fields') is None
+            and not kwargs.get('force_insert')
+            and not self._state.adding
+        ):
+            deferred_fields = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+                and field.attname not in deferred_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+class User(CountersMixin, AbstractUser):
     """Модель пользователей."""
 
     USERNAME_FIELD = 'email'
@@ -43,6 +70,25 @@ class User(AbstractUser):
         blank=True,
         default=''
     )
+    recipes_count = models.PositiveIntegerField(
+        'Количество рецептов',
+        default=0,
+        editable=False,
+    )
+    followers_count = models.PositiveIntegerField(
+        'Количество подписчиков',
+        default=0,
+        editable=False,
+    )
+    avatar_rendered = models.CharField(
+        'Аватар с уменьшенными копиями',
+        max_length=100,
+        blank=True,
+        default='',
+        editable=False,
+    )
+
+    counter_fields = ('recipes_count', 'followers_count', 'avatar_rendered')
 
     class Meta:
         verbose_name = 'Пользователь'